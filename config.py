@@ -3,10 +3,102 @@
 # preferences
 LYRICS_FETCH_MODE = 2 # synced[0], unsynced[1], synced_with_fallback[2] (Default:2)
 
+# concurrency
+MAX_CONCURRENT_SONGS = 8 # songs in flight at once, 1 = sequential (Default:8)
+PROVIDER_CONCURRENCY = { # max simultaneous lookups per provider
+    "MusixMatch": 4,    # browser lookups share BROWSER_PAGE_POOL_SIZE pages
+    "LrclibLocal": 8,   # local database, no network
+    "Lrclib": 4,
+    "Genius": 4,
+    "JioSaavn": 4,
+}
+PROVIDER_FANOUT = False # query all providers at once and keep the highest priority hit (Default:False)
+PROVIDER_ORDERING = 0 # fixed priority[0], learned from hit rate and latency[1] (Default:0)
+PROVIDER_STATS_FILE = "provider_stats.db" # per provider hit rate and latency by song features, kept across runs, None = this run only. only written with PROVIDER_ORDERING = 1
+PROVIDER_STATS_MIN_LOOKUPS = 10 # lookups a feature bucket needs before learned ordering trusts it
+
+# rate limits
+RATE_LIMITS = { # (start, min, max) requests per second, adapted from 429/5xx responses
+    "MusixMatch": (5.0, 0.5, 20.0),
+    "Lrclib": (2.0, 0.2, 10.0),
+    "Genius": (5.0, 0.5, 20.0),
+    "JioSaavn": (5.0, 0.5, 20.0),
+}
+RATE_LIMIT_MAX_WAIT_S = 5 # a throttled provider is skipped instead of waiting longer than this
+REQUEUE_DELAY_S = 30 # throttled songs are retried after Retry-After, or this long
+MAX_REQUEUES = 3 # times a throttled song is requeued before it counts as failed
+
+# circuit breakers, a provider that keeps failing or timing out is skipped for a while
+BREAKER_WINDOW = 20 # recent lookups per provider the failure rate is taken over
+BREAKER_MIN_CALLS = 5 # lookups needed before a breaker can open
+BREAKER_FAILURE_RATE = 0.5 # share of failed lookups that opens the breaker [0-1] (Default:0.5)
+BREAKER_SLOW_CALL_S = 20 # a lookup slower than this counts as failed, None = only errors count
+BREAKER_OPEN_S = 120 # skip time before a single probe lookup is let through
+
+# string normalization
+STOP_PHRASES = ["Various Interprets", "Various Artists"] # removed from tags and candidates before matching, case insensitive
+NORMALIZE_CACHE_SIZE = 8192 # cleaned strings kept in memory
+
+# album batching
+ALBUM_BATCHING = True # resolve an album's track list once for all its songs (Spotify, JioSaavn) (Default:True)
+ALBUM_MIN_TRACKS = 2 # songs of an album in a run needed for an album lookup
+ALBUM_MAX_GROUP = 100 # songs of one album buffered at most before they are released to the workers
+ALBUM_CACHE_SIZE = 64 # album track lists kept in memory
+
+# local lrclib database
+LRCLIB_DB_FILE = None # lrclib database dump (sqlite), searched before the lrclib api, None = disabled
+LRCLIB_INDEX_FILE = "lrclib_index.db" # search index of the dump, built by python -m tools.lrclib_index
+
+# candidate matching
+MATCH_DURATION_TOLERANCE_S = 10 # candidates whose duration differs more are skipped, None = no duration check
+
+# http transport, shared keep-alive connection pools
+HTTP_POOL_MAXSIZE = 16 # connections kept per host
+HTTP_CONNECT_TIMEOUT_S = 5
+HTTP_READ_TIMEOUT_S = 15 # default, fetchers may pass their own
+HTTP_RETRIES = 2 # retries of idempotent GETs on connection errors/5xx, with backoff
+HTTP_BACKOFF_FACTOR = 0.5
+
+# record/replay of provider responses, for offline benchmarks
+HTTP_CASSETTE_MODE = 0 # off[0], record[1], replay[2] (Default:0)
+HTTP_CASSETTE_FILE = "cassette.jsonl" # responses are appended here when recording
+HTTP_REPLAY_URL = "http://127.0.0.1:8765" # replay server, see tools/replay_server.py
+
+# run metrics, stage timings exported at the end of a run
+METRICS_JSON_FILE = "metrics.json" # every span plus the summary, None = disabled
+METRICS_PROMETHEUS_FILE = "metrics.prom" # prometheus text format, None = disabled
+
+# result cache
+RESULT_CACHE_FILE = "lyrics_cache.db" # provider results cache, None = disabled
+RESULT_CACHE_HIT_TTL_DAYS = 90  # found lyrics are reused for this long
+RESULT_CACHE_MISS_TTL_DAYS = 7  # not found results are rechecked after this long, at most RETRY_FAILED_AFTER_HOURS in incremental mode
+
+# incremental runs
+INCREMENTAL_MODE = True # only process new/changed songs and failures due for retry (Default:True)
+MANIFEST_FILE = "library_manifest.db" # per song record of previous runs
+RETRY_FAILED_AFTER_HOURS = 24 # songs without lyrics are retried after this long
+
+# spotify track resolution
+SPOTIFY_RESOLVE_MODE = 2 # search api[0], browser[1], api_with_browser_fallback[2] (Default:2)
+BROWSER_PAGE_POOL_SIZE = 4 # pages searching side by side in the shared browser
+BROWSER_PAGE_MAX_USES = 50 # a page is recycled after this many lookups
+BROWSER_BLOCKED_RESOURCES = ["image", "font", "media"] # request types the browser doesn't load, they are not needed for a search
+
+# credentials
+CREDENTIAL_CACHE_FILE = ".credentials_cache.json" # totp secret and spotify token reused across runs, None = disabled
+TOTP_SECRET_TTL_HOURS = 24 # totp secret is downloaded again after this long
+
 # music paths
-MUSIC_DIRECTORY = "C:/Users/Max/Desktop/music/small" # shallow search
-OUTPUT_DIRECTORY = "C:/Users/Max/Desktop/music/small" # output directory for song_name.lrc
+MUSIC_DIRECTORY = "C:/Users/Max/Desktop/music/small"
+MUSIC_DIRECTORIES = [MUSIC_DIRECTORY] # library roots, searched recursively
+OUTPUT_DIRECTORY = "C:/Users/Max/Desktop/music/small" # output directory for song_name.lrc, None = next to each song
+
+# library scan
+SCAN_INCLUDE = [] # globs relative to a library root, eg. "Bollywood/*", empty = everything
+SCAN_EXCLUDE = [] # globs relative to a library root, eg. "*/Podcasts"
+SCAN_WORKERS = 8 # threads reading audio tags
 
-# Element identifier(s)
-SPOTIFY_TRACK_CSS_SELECTOR = '#searchPage > div > div > div > div.eaxF79s4oV8I2CPQ > div > div.m9t_KhZ6MI0XQj9b > div:nth-child(2) > div:nth-child(1) > div > div.NILrlF6tOUcbSyzo > div > a'
+# network identifier(s), used by browser resolution only
+SPOTIFY_SEARCH_RESPONSE_URL = "/pathfinder/" # the search page's graphql requests contain this in their url
+SPOTIFY_SEARCH_OPERATION = "search" # operationName prefix of the search query (searchDesktop, searchTracks, ...)
 
@@ -1,10 +1,49 @@
-from utils.helpers import save_lyrics, format_time, get_songs, clear_profile_cache
-from config import MUSIC_DIRECTORY, OUTPUT_DIRECTORY, LYRICS_FETCH_MODE
+import time
+STARTED_AT = time.time()    # for the startup time report
+
+from utils.helpers import save_lyrics, format_time, clear_profile_cache, setup_logging
+from config import MUSIC_DIRECTORIES, OUTPUT_DIRECTORY, LYRICS_FETCH_MODE, MAX_CONCURRENT_SONGS, INCREMENTAL_MODE, MANIFEST_FILE, RETRY_FAILED_AFTER_HOURS
+from config import SCAN_INCLUDE, SCAN_EXCLUDE, SCAN_WORKERS, REQUEUE_DELAY_S, MAX_REQUEUES, METRICS_JSON_FILE, METRICS_PROMETHEUS_FILE
 from pathlib import Path
+from functools import partial
 import logging
-from utils.fetch.from_all import fetch_lyrics
-import time
-from utils.fetch.musixmatch import driver
+from utils.fetch.from_all import fetch_lyrics_with_source, open_result_cache, open_provider_stats
+from utils.fetch.registry import startup_report, close_providers
+from utils.manifest import LibraryManifest, FOUND, NOT_FOUND, ERROR
+from utils.pipeline import run_concurrent
+from utils.scanner import scan_library
+from utils.albums import group_by_album
+from utils.rate_limit import RateLimited
+from utils.transport import transport
+from utils.metrics import metrics
+from utils.circuit_breaker import breaker_report
+
+def lyrics_dir_for(song_path: Path) -> Path:
+    """directory the .lrc of a song is saved to"""
+    return Path(OUTPUT_DIRECTORY) if OUTPUT_DIRECTORY else song_path.parent
+
+def process_song(scanned: tuple, result_cache=None, provider_stats=None) -> str|None:
+    """fetch and save lyrics of a single scanned song
+
+    :param scanned: (song_path, SongMetadata, tag read exception) from the library scanner
+    :type scanned: tuple
+    :param result_cache: cache of provider results, None = no caching
+    :type result_cache: ResultCache | None
+    :param provider_stats: stats provider lookups are recorded to
+    :type provider_stats: ProviderStats | None
+    :return: name of the source lyrics were saved from, None if not found
+    :rtype: str | None
+    """
+    song_path, song, exception = scanned
+    if exception is not None: raise exception
+    with metrics.context(song=song_path.name):
+        lyrics, source_name = fetch_lyrics_with_source(song=song, fetch_mode=LYRICS_FETCH_MODE, result_cache=result_cache, provider_stats=provider_stats)
+        if lyrics is not False:
+            # save lyrics to location
+            with metrics.span("save", provider=source_name):
+                save_lyrics(lyrics=lyrics, out_dir=lyrics_dir_for(song_path), out_filename=song_path.stem) # song.stem = song filename only
+            return source_name
+    return None
 
 def main() -> int:
     """main function
@@ -12,42 +51,74 @@ def main() -> int:
     :return: 0
     :rtype: int
     """
+    setup_logging()
     log = logging.getLogger(__name__)
+    log.info(f"==== Startup took {time.time() - STARTED_AT:0.2f}s ====")
+    for line in startup_report(): log.info(f"Provider {line}")
 
     total_processed = 0
     total_found_and_saved = 0
 
-    music_files = get_songs(music_dir=MUSIC_DIRECTORY)
+    manifest = None
+    path_filter = None
+    if INCREMENTAL_MODE:
+        # skip songs that are done, resume interrupted runs
+        manifest = LibraryManifest(db_path=MANIFEST_FILE, retry_failed_after_s=RETRY_FAILED_AFTER_HOURS * 3600)
+        path_filter = lambda song_path: manifest.needs_processing(song_path=song_path, lrc_path=lyrics_dir_for(song_path) / f"{song_path.stem}.lrc")
+
+    # streams songs while the library walk is still running
+    music_files = scan_library(roots=MUSIC_DIRECTORIES, include=SCAN_INCLUDE, exclude=SCAN_EXCLUDE, workers=SCAN_WORKERS, path_filter=path_filter)
+    # songs of an album stay together, so its track list is resolved once for all of them
+    music_files = group_by_album(music_files)
+
+    requeue_counts = {}
+    def requeue(scanned: tuple, exception: BaseException) -> float|None:
+        """retry throttled songs later instead of dropping them"""
+        song_path = scanned[0]
+        if not isinstance(exception, RateLimited) or requeue_counts.get(song_path, 0) >= MAX_REQUEUES:
+            return None
+        requeue_counts[song_path] = requeue_counts.get(song_path, 0) + 1
+        delay_s = exception.retry_after_s or REQUEUE_DELAY_S
+        log.info(f"REQUEUED - {song_path.stem}: {exception}, retry in {delay_s:0.1f}s")
+        return delay_s
+
+    result_cache = open_result_cache()
+    provider_stats = open_provider_stats()
+    worker = partial(process_song, result_cache=result_cache, provider_stats=provider_stats)
 
     start_time = time.time()
-    for song_path in music_files:
+    for (song_path, song, _), source_name, exception in run_concurrent(music_files, worker=worker, max_workers=MAX_CONCURRENT_SONGS, requeue=requeue):
         total_processed += 1
-        try:
-            log.info(f"{total_processed}. {song_path.stem}")
-            lyrics = fetch_lyrics(song_path=song_path, fetch_mode=LYRICS_FETCH_MODE)
-            if isinstance(lyrics, str):
-                # save lyrics to location
-                save_lyrics(lyrics=lyrics, out_dir=OUTPUT_DIRECTORY, out_filename=song_path.stem) # song.stem = song filename only
-                total_found_and_saved += 1
-
-        except Exception as e: log.exception(f"FAILED: {song_path.name}")
+        log.info(f"{total_processed}. {song_path.stem}")
+        if exception is not None:
+            log.error(f"FAILED: {song_path.name}", exc_info=exception)
+            if manifest is not None: manifest.record(song_path, outcome=ERROR)
+            continue
+        if source_name is not None: total_found_and_saved += 1
+        if manifest is not None: manifest.record(song_path, outcome=FOUND if source_name else NOT_FOUND, provider=source_name, tag_hash=song.tag_hash)
 
-    driver.close()
+    close_providers()
     clear_profile_cache()
+    if result_cache is not None: result_cache.close()
+    if provider_stats is not None: provider_stats.flush()
+    if manifest is not None: manifest.close()
+    http_stats = transport.stats()
+    transport.close()
 
     success_rate = (total_found_and_saved / total_processed) * 100 if total_processed else 0.0
     elapsed_time = time.time() - start_time
-    # ------------------------------------------
-    from utils.fetch.musixmatch import total_wasted_time
-    print(f"Total wasted time: {format_time(total_wasted_time["total_wasted_time"])}")
-    # ------------------------------------------
     avg_time_per_song_found = elapsed_time / total_found_and_saved if total_found_and_saved else 0.0
     log.info("==== Summary ====")
     log.info(f"Success Rate: {success_rate:0.2f}% | {total_found_and_saved}/{total_processed}")
     log.info(f"Average time per song found: {avg_time_per_song_found:0.2f}(seconds)")
     log.info(f"Total elapsed time: {format_time(elapsed_time)}") # 23hrs:12min:59sec,213ms
+    log.info(f"HTTP: {http_stats['requests']} requests, {http_stats['handshakes']} handshakes, {http_stats['reused']} reused")
+    for line in startup_report(): log.info(f"Provider {line}")
+    for line in breaker_report(): log.info(f"Breaker {line}")
+    log.info("==== Stage latencies ====")
+    for line in metrics.report_lines(): log.info(line)
+    metrics.export(json_file=METRICS_JSON_FILE, prometheus_file=METRICS_PROMETHEUS_FILE)
     return 0
 
 if __name__ == "__main__":
     main()
-
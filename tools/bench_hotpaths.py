@@ -0,0 +1,166 @@
+"""
+microbenchmarks of the cpu hot paths of a run, run from the repo root:
+    python -m tools.bench_hotpaths [--save] [--baseline bench_hotpaths_baseline.json] [--threshold 0.2] [--only NAME ...]
+
+every benchmark runs on fixed synthetic inputs (unicode heavy hindi/latin
+tags, 200 line synced lyrics, 20 candidate lrclib responses), so results are
+comparable between runs on one machine. --save stores the results as the
+baseline, later runs are compared against it and exit with 1 if a benchmark
+got slower by more than --threshold.
+"""
+import sys
+import json
+import random
+import timeit
+import argparse
+import platform
+from pathlib import Path
+from utils.helpers import SongMetadata, clean_string, build_search_query, match_song_metadata, extract_spotify_lyrics
+from utils.normalize import normalize
+from utils.matching import best_match
+from utils.lyrics import Lyrics, ms_to_timestamp
+from utils.fetch.lrclib import _best_lyrics
+from tools.lead_lyrics import shift_lrc_text
+
+SEED = 7
+LYRICS_LINES = 200
+CANDIDATES = 20
+TAG_SETS = 100
+REPEAT = 5
+DEFAULT_BASELINE_FILE = "bench_hotpaths_baseline.json"
+
+HINDI_WORDS = ["तौबा", "दिल", "सपना", "रात", "इश्क़", "ज़िंदगी", "मोहब्बत", "बारिश", "चाँद", "तेरे", "बिना", "कभी"]
+LATIN_WORDS = ["Tauba", "Dil", "Sapna", "Raat", "Ishq", "Zindagi", "Love", "Night", "Fire", "Déjà", "Café", "Naïve"]
+DECORATIONS = ["", "", " (From \"Kaal\")", " (feat. Sonu Nigam)", " (Remastered 2011)", " - Live", " [Lofi Flip]", "!"]
+ARTISTS = ["Sonu Nigam", "Salim–Sulaiman", "Shreya Ghoshal", "A.R. Rahman", "सोनू निगम", "श्रेया घोषाल", "Various Artists", "AC/DC"]
+
+
+def _title(rng: random.Random) -> str:
+    words = rng.choice([HINDI_WORDS, LATIN_WORDS, HINDI_WORDS + LATIN_WORDS])
+    return " ".join(rng.choice(words) for _ in range(rng.randint(1, 5))) + rng.choice(DECORATIONS)
+
+def _song(rng: random.Random) -> SongMetadata:
+    title, artist, album = _title(rng), rng.choice(ARTISTS), f"{_title(rng)} (Original Motion Picture Soundtrack)"
+    return SongMetadata(
+        path=Path(f"{title}.flac"), title=clean_string(title), artist=clean_string(artist), album=clean_string(album),
+        albumartist="", duration=rng.uniform(150, 330), query=build_search_query(title, artist, album),
+        tag_hash="", raw_tags=(title, artist, album, ""),
+    )
+
+def _lyrics_texts(rng: random.Random) -> list[str]:
+    return [" ".join(rng.choice(HINDI_WORDS + LATIN_WORDS) for _ in range(rng.randint(3, 9))) for _ in range(LYRICS_LINES)]
+
+def build_inputs(seed: int = SEED) -> dict:
+    """the fixed inputs of every benchmark"""
+    rng = random.Random(seed)
+    tags = [(_title(rng), rng.choice(ARTISTS), _title(rng)) for _ in range(TAG_SETS)]
+    song = _song(rng)
+    title, artist, album, _ = song.raw_tags
+
+    texts = _lyrics_texts(rng)
+    start_ms = sorted(rng.sample(range(0, 300_000), LYRICS_LINES))
+    synced_lrc = "\n".join(f"[{ms_to_timestamp(ms)}] {text}" for ms, text in zip(start_ms, texts))
+
+    # the matching candidate sits at a random position among near misses
+    candidates = []
+    for i in range(CANDIDATES):
+        candidates.append({
+            "id": i, "trackName": _title(rng), "artistName": rng.choice(ARTISTS), "albumName": _title(rng),
+            "duration": song.duration + rng.uniform(-30, 30), "syncedLyrics": synced_lrc, "plainLyrics": "\n".join(texts),
+        })
+    candidates[rng.randrange(CANDIDATES)].update(trackName=title, artistName=artist, albumName=album, duration=song.duration)
+    infos = [f'{item["trackName"]} {item["artistName"]} {item["albumName"]}' for item in candidates]
+
+    spotify_json = {"lyrics": {"syncType": "LINE_SYNCED", "lines": [
+        {"startTimeMs": str(ms), "words": f" {text} ", "syllables": [], "endTimeMs": "0"} for ms, text in zip(start_ms, texts)
+    ]}}
+    return {
+        "tags": tags,
+        "strings": [s for tag_set in tags for s in tag_set],
+        "song": song,
+        "infos": infos,
+        "durations": [item["duration"] for item in candidates],
+        "lrclib_response": candidates,
+        "spotify_json": spotify_json,
+        "synced_lrc": synced_lrc,
+        "lyrics": Lyrics.from_lrc(synced_lrc, source="Lrclib"),
+    }
+
+def build_benchmarks(inputs: dict) -> dict:
+    """name -> (function, operations per call)"""
+    song = inputs["song"]
+
+    def clean_string_uncached():
+        for s in inputs["strings"]: normalize.__wrapped__(s)
+
+    def clean_string_memoized():
+        for s in inputs["strings"]: clean_string(s)
+
+    def build_search_query_uncached():
+        normalize.cache_clear()     # a query is built once per song, its tags are not cached yet
+        for title, artist, album in inputs["tags"]: build_search_query(title, artist, album)
+
+    def match_song_metadata_20():
+        for info in inputs["infos"]: match_song_metadata(song, info, threshold=60)
+
+    return {
+        "clean_string_uncached": (clean_string_uncached, len(inputs["strings"])),
+        "clean_string_memoized": (clean_string_memoized, len(inputs["strings"])),
+        "build_search_query": (build_search_query_uncached, len(inputs["tags"])),
+        "match_song_metadata_20": (match_song_metadata_20, 1),
+        "best_match_20": (lambda: best_match(song, inputs["infos"], threshold=60, durations=inputs["durations"]), 1),
+        "extract_spotify_lyrics_200": (lambda: extract_spotify_lyrics(inputs["spotify_json"]), 1),
+        "lrclib_best_lyrics_20x200": (lambda: _best_lyrics(song, inputs["lrclib_response"], key="syncedLyrics"), 1),
+        "lyrics_from_lrc_200": (lambda: Lyrics.from_lrc(inputs["synced_lrc"], source="Lrclib"), 1),
+        "lyrics_serialize_200": (lambda: inputs["lyrics"].serialize(), 1),
+        "shift_lrc_text_200": (lambda: shift_lrc_text(inputs["synced_lrc"], offset_ms=-250), 1),
+    }
+
+def run_benchmark(function, operations: int, repeat: int = REPEAT) -> float:
+    """µs per operation, best of repeat runs"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()   # calls per run, so a run takes at least 0.2s
+    return min(timer.repeat(repeat=repeat, number=number)) / number / operations * 1e6
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    """names of benchmarks slower than baseline by more than threshold"""
+    return [name for name, us in results.items() if name in baseline and us > baseline[name] * (1 + threshold)]
+
+def main(args: argparse.Namespace) -> bool:
+    benchmarks = build_benchmarks(build_inputs())
+    if args.only: benchmarks = {name: benchmark for name, benchmark in benchmarks.items() if name in args.only}
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["results"] if baseline_path.exists() else {}
+
+    results = {}
+    for name, (function, operations) in benchmarks.items():
+        results[name] = run_benchmark(function, operations)
+        line = f"{name:<28} {results[name]:12.2f} µs/op"
+        if name in baseline:
+            change = results[name] / baseline[name] - 1
+            flag = " REGRESSION" if change > args.threshold else ""
+            line += f" | baseline {baseline[name]:12.2f} µs/op {change * 100:+7.1f}%{flag}"
+        print(line)
+
+    if args.save:
+        data = {"python": platform.python_version(), "machine": platform.machine(), "results": {**baseline, **results}}
+        baseline_path.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline saved to {baseline_path}")
+        return True
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions: print(f"FAILURE - {len(regressions)} regressions above {args.threshold * 100:0.0f}%: {', '.join(regressions)}")
+    elif baseline: print(f"SUCCESS - no regressions above {args.threshold * 100:0.0f}%")
+    else: print(f"No baseline at {baseline_path}, save one with --save")
+    return not regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="microbenchmarks of the cpu hot paths")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="baseline results file")
+    parser.add_argument("--save", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline, 0.2 = 20%%")
+    parser.add_argument("--only", nargs="*", default=None, help="run only these benchmarks")
+    args = parser.parse_args()
+    sys.exit(0 if main(args) else 1)
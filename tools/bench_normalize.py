@@ -0,0 +1,93 @@
+"""
+microbenchmark of string normalization, run from the repo root:
+    python -m tools.bench_normalize [music_directory ...]
+
+checks that utils.normalize gives byte identical output to the legacy
+clean_string on a golden corpus (built in strings, random strings and the
+tags of any given music directories), then reports strings/sec of both.
+"""
+import re
+import sys
+import time
+import random
+from utils.normalize import normalize
+from utils.scanner import walk_audio_files
+from mutagen import File, MutagenError
+
+GOLDEN_STRINGS = [
+    "",
+    "   ",
+    "Tauba Tauba",
+    "Tauba Tauba (From \"Kaal\")",
+    "Song (feat. Someone) (Remastered 2011)",
+    "Unclosed (bracket",
+    "Nested (a (b) c) tail",
+    "((double)) open",
+    "Various Artists",
+    "various-artists - Hits",
+    "VARIOUS INTERPRETS, Vol. 2",
+    "AC/DC - Back_In_Black",
+    "Ñandú · Déjà vu — naïve café",
+    "Salim–Sulaiman, Sonu Nigam · Kaal (Original Motion Picture Soundtrack) · Song · 2005",
+    "तौबा तौबा ÷ सोनू निगम",
+    "数字 ÷ 音楽 (ライブ)",
+    "tab\there\nnew line\r\x0b\x0c\x1c\x1d\x1e\x1f\x85\xa0 end",
+    "İstanbul ǅemal ß ﬁ",
+    "100% Pure_Love!!! #1 @home",
+]
+RANDOM_ALPHABET = "abcXYZ _-()÷.,!'\"/\\&·–—éßİǅ\t\n\xa0 \x1c\x85तौ数字0123456789" + " Various Artists Interprets"
+
+def legacy_clean_string(raw_string:str) -> str:
+    """clean_string as it was before utils/normalize.py, the golden reference"""
+    clean_string = raw_string.lower()                         # to lowercase
+    clean_string = re.sub(r"\s*\([^)]*\)", "", clean_string)  # remove anything inside brackets with themselves
+    clean_string = re.sub(r"[^\w\s÷]", " ", clean_string, flags=re.UNICODE)  # remove punctuation, keep unicode,÷(for other languages)
+    clean_string = clean_string.replace("_", " ") # unicode flag ignores "_"
+    clean_string = re.sub(r"\s*Various Interprets", "", clean_string, flags=re.IGNORECASE)  # remove "Various Interprets"
+    clean_string = re.sub(r"\s*Various Artists", "", clean_string, flags=re.IGNORECASE)  # remove "Various Interprets"
+    clean_string = re.sub(r"\s+", " ", clean_string).strip()  # clean excess whitespace
+    return clean_string
+
+def build_corpus(music_directories: list[str], random_count: int = 20000, seed: int = 1) -> list[str]:
+    corpus = list(GOLDEN_STRINGS)
+    rng = random.Random(seed)
+    for _ in range(random_count):
+        corpus.append("".join(rng.choice(RANDOM_ALPHABET) for _ in range(rng.randint(0, 60))))
+    for song_path in walk_audio_files(roots=music_directories):
+        try: audio = File(song_path, easy=True)
+        except MutagenError: continue   # unreadable file, skip it
+        if audio is None: continue
+        for key in ("title", "artist", "album", "albumartist"):
+            corpus.extend(audio.get(key, []))
+    return corpus
+
+def strings_per_sec(function, corpus: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for raw_string in corpus:
+            function(raw_string)
+    return len(corpus) * repeat / (time.perf_counter() - start)
+
+def main(music_directories: list[str]) -> bool:
+    corpus = build_corpus(music_directories)
+    mismatches = [s for s in corpus if normalize(s) != legacy_clean_string(s)]
+    for s in mismatches[:10]:
+        print(f"MISMATCH - {s!r}: {normalize(s)!r} != {legacy_clean_string(s)!r}")
+    print(f"golden corpus: {len(corpus)} strings, {len(mismatches)} mismatches")
+    if mismatches: return False
+
+    # tags repeat for every provider and candidate, so a realistic workload re-cleans the same strings
+    workload = corpus[:2000] * 5
+    legacy = strings_per_sec(legacy_clean_string, workload, repeat=3)
+    normalize.cache_clear()
+    uncached = strings_per_sec(normalize.__wrapped__, workload, repeat=3)
+    normalize.cache_clear()
+    cached = strings_per_sec(normalize, workload, repeat=3)
+    print(f"legacy clean_string : {legacy:12,.0f} strings/sec")
+    print(f"normalize (no cache): {uncached:12,.0f} strings/sec | x{uncached / legacy:0.2f}")
+    print(f"normalize (memoized): {cached:12,.0f} strings/sec | x{cached / legacy:0.2f}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(sys.argv[1:]) else 1)
@@ -0,0 +1,226 @@
+"""
+offline end to end throughput benchmark, run from the repo root:
+    python -m tools.bench_pipeline [--songs 500] [--album-size 10] [--latency-ms 20] [--jitter-ms 10] [--error-rate 0] [--json FILE]
+
+builds a synthetic library of tagged flac files and a cassette of provider
+responses for it (lrclib signature hits, lrclib search hits, jiosaavn hits
+and misses), serves the cassette from tools/replay_server.py in its own
+process and runs main.main() over the library in replay mode. reports
+songs/sec, cpu time and peak rss of the run, so runs before and after a
+change can be compared.
+
+musixmatch and genius are skipped by clearing their tokens. musixmatch's
+spotify auth and browser search don't go through the shared transport.
+genius does, its responses just aren't part of the synthetic cassette.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import struct
+import logging
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from mutagen.flac import FLAC
+import config
+
+try: import resource
+except ImportError: resource = None     # windows
+
+SAMPLE_RATE = 44100
+LRCLIB_SEARCH_URL = "https://lrclib.net/api/search"
+LRCLIB_GET_URL = "https://lrclib.net/api/get"
+SAAVN_SEARCH_URL = "https://saavn.sumit.co/api/search"
+# share of songs per outcome, the rest is not found anywhere
+OUTCOMES = (("lrclib_signature", 0.6), ("lrclib_search", 0.2), ("jiosaavn", 0.1))
+WORDS = ["love", "night", "fire", "river", "dream", "shadow", "golden", "heart", "rain", "city",
+         "tauba", "dil", "sapna", "raat", "ishq", "zindagi", "echo", "neon", "summer", "ghost"]
+
+
+def write_flac(path: Path, title: str, artist: str, album: str, duration_s: int):
+    """a tagged flac file without audio frames, enough for the tag reader"""
+    # STREAMINFO: block sizes, frame sizes, 20 bit sample rate, 3 bit channels-1, 5 bit bits per sample-1, 36 bit total samples, md5
+    info = struct.pack(">HH", 4096, 4096) + b"\x00" * 6
+    info += ((SAMPLE_RATE << 44) | (1 << 41) | (15 << 36) | (duration_s * SAMPLE_RATE)).to_bytes(8, "big")
+    info += b"\x00" * 16
+    path.write_bytes(b"fLaC" + bytes([0x80]) + len(info).to_bytes(3, "big") + info)
+    audio = FLAC(path)
+    audio["title"], audio["artist"], audio["album"] = title, artist, album
+    audio.save()
+
+def fake_lyrics(rng: random.Random, lines: int = 40) -> tuple[str, str]:
+    """(synced, plain) lyrics"""
+    texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))) for _ in range(lines)]
+    synced = "\n".join(f"[{i * 4 // 60:02d}:{i * 4 % 60:02d}.{rng.randint(0, 99):02d}] {text}" for i, text in enumerate(texts))
+    return synced, "\n".join(texts)
+
+def build_corpus(library_dir: Path, songs: int, album_size: int, seed: int) -> list[tuple[Path, str]]:
+    """write the synthetic library, returns (song_path, outcome) per song"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(songs):
+        album_no = i // album_size
+        artist = f"Artist {album_no % 50} {WORDS[album_no % len(WORDS)].title()}"
+        album = f"{WORDS[album_no * 7 % len(WORDS)].title()} {WORDS[album_no * 3 % len(WORDS)].title()} {album_no}"
+        title = f"{' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()} {i}"
+        album_dir = library_dir / f"{artist} - {album}"
+        album_dir.mkdir(parents=True, exist_ok=True)
+        song_path = album_dir / f"{i % album_size + 1:02d} {title}.flac"
+        write_flac(song_path, title=title, artist=artist, album=album, duration_s=rng.randint(120, 360))
+
+        roll, outcome = rng.random(), None
+        for name, share in OUTCOMES:
+            if roll < share:
+                outcome = name
+                break
+            roll -= share
+        corpus.append((song_path, outcome))
+    return corpus
+
+def build_cassette(corpus: list[tuple[Path, str]], cassette_file: Path, seed: int) -> int:
+    """cassette answering the provider requests of the corpus, returns the number of interactions"""
+    from utils.cassette import cassette_key
+    from utils.helpers import read_song_metadata
+
+    rng = random.Random(seed)
+    entries = []
+    def add(url: str, params: dict|None, body):
+        entries.append({"key": cassette_key(url, params), "status": 200, "content_type": "application/json", "body": json.dumps(body, ensure_ascii=False)})
+
+    for song_path, outcome in corpus:
+        if outcome is None: continue
+        song = read_song_metadata(song_path)
+        title, artist, album, _ = song.raw_tags
+        synced, plain = fake_lyrics(rng)
+        item = {"id": rng.randint(1, 10**7), "trackName": title, "artistName": artist, "albumName": album,
+                "duration": song.duration, "syncedLyrics": synced, "plainLyrics": plain}
+        if outcome == "lrclib_signature":
+            add(LRCLIB_GET_URL, {"track_name": title, "artist_name": artist, "album_name": album, "duration": round(song.duration)}, item)
+        elif outcome == "lrclib_search":
+            others = [{**item, "id": rng.randint(1, 10**7), "trackName": f"{rng.choice(WORDS)} {rng.choice(WORDS)}"} for _ in range(9)]
+            add(LRCLIB_SEARCH_URL, {"q": song.query}, [*others, item])
+        elif outcome == "jiosaavn":
+            lyrics_id = f"saavn{rng.randint(1, 10**7)}"
+            result = {"id": lyrics_id, "name": title, "duration": round(song.duration),
+                      "album": {"name": album}, "artists": {"all": [{"name": artist}]}}
+            add(f"{SAAVN_SEARCH_URL}/songs", {"query": song.query}, {"success": True, "data": {"results": [result]}})
+            add(f"https://www.jiosaavn.com/api.php?__call=lyrics.getLyrics&lyrics_id={lyrics_id}&ctx=web6dot0&api_version=4&_format=json&_marker=0", None,
+                {"lyrics": plain.replace("\n", "<br>")})
+
+    with open(cassette_file, "w", encoding="utf-8") as f:
+        for entry in entries: f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return len(entries)
+
+def start_replay_server(cassette_file: Path, args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    """replay server in its own process, so it doesn't count towards cpu time and rss"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "tools.replay_server", str(cassette_file), "--port", "0",
+         "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+         "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate), "--seed", str(args.seed)],
+        stdout=subprocess.PIPE, text=True, cwd=Path(__file__).resolve().parent.parent,
+    )
+    first_line = process.stdout.readline().strip()     # "Serving N interactions at URL"
+    if not first_line.startswith("Serving"):
+        process.kill()
+        raise RuntimeError(f"Replay server did not start: {first_line!r}")
+    return process, first_line.rsplit(" ", 1)[-1]
+
+def peak_rss_mb() -> float|None:
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024   # bytes on macos, KiB elsewhere
+
+def run(args: argparse.Namespace) -> dict:
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    library_dir = work_dir / "library"
+    cassette_file = work_dir / "cassette.jsonl"
+    lyrics_dir = work_dir / "lyrics"
+    lyrics_dir.mkdir()
+
+    corpus = build_corpus(library_dir, songs=args.songs, album_size=args.album_size, seed=args.seed)
+    interactions = build_cassette(corpus, cassette_file, seed=args.seed)
+    expected_found = sum(outcome is not None for _, outcome in corpus)
+    print(f"Corpus: {len(corpus)} songs, {interactions} recorded interactions, {expected_found} findable")
+
+    server, replay_url = start_replay_server(cassette_file, args)
+    try:
+        # main and the fetchers read config at import, so it is set up before importing them
+        config.MUSIC_DIRECTORIES = [str(library_dir)]
+        config.OUTPUT_DIRECTORY = str(lyrics_dir)
+        config.RESULT_CACHE_FILE = None
+        config.INCREMENTAL_MODE = False
+        config.LRCLIB_DB_FILE = None
+        config.METRICS_JSON_FILE = None
+        config.METRICS_PROMETHEUS_FILE = None
+        config.HTTP_CASSETTE_MODE = 2
+        config.HTTP_REPLAY_URL = replay_url
+        if not args.keep_rate_limits:   # measure the pipeline, not the request budget
+            for provider, (_, min_rate, _) in list(config.RATE_LIMITS.items()):
+                config.RATE_LIMITS[provider] = (10000.0, min_rate, 10000.0)
+        for key in ("SP_DC_TOKEN", "GENIUS_ACCESS_TOKEN"): os.environ[key] = ""    # not replayable, see module docstring
+        # log to a file only, main's setup_logging keeps an existing configuration
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                            handlers=[logging.FileHandler(work_dir / "main.log", encoding="utf-8")])
+
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            import main
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            main.main()
+            elapsed_s = time.perf_counter() - start
+            cpu_s = time.process_time() - cpu_start
+        finally:
+            os.chdir(cwd)
+    finally:
+        server.terminate()
+        server.wait()
+
+    found = sum(1 for _ in lyrics_dir.glob("*.lrc"))
+    if not args.keep: shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "songs": len(corpus),
+        "found": found,
+        "expected_found": expected_found,
+        "elapsed_s": elapsed_s,
+        "songs_per_s": len(corpus) / elapsed_s if elapsed_s else 0.0,
+        "cpu_s": cpu_s,
+        "cpu_ms_per_song": cpu_s * 1000 / len(corpus) if corpus else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "work_dir": str(work_dir),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="offline end to end throughput benchmark")
+    parser.add_argument("--songs", type=int, default=500)
+    parser.add_argument("--album-size", type=int, default=10, help="songs per album")
+    parser.add_argument("--latency-ms", type=float, default=20, help="replay server delay per response")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="random extra delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of responses that are 503 [0-1]")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="share of responses that are 429 [0-1]")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the RATE_LIMITS of config.py")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="keep the library, cassette and main.log of the run")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    rss = f"{results['peak_rss_mb']:0.1f}MB" if results["peak_rss_mb"] is not None else "n/a"
+    print(f"Found: {results['found']}/{results['songs']} (expected {results['expected_found']})")
+    print(f"Throughput: {results['songs_per_s']:0.1f} songs/sec ({results['elapsed_s']:0.2f}s)")
+    print(f"CPU: {results['cpu_s']:0.2f}s ({results['cpu_ms_per_song']:0.2f}ms/song)")
+    print(f"Peak RSS: {rss}")
+    if args.keep: print(f"Kept: {results['work_dir']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+    sys.exit(0)
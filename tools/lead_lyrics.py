@@ -1,43 +1,205 @@
+"""
+shift .lrc timestamps of a whole library, run from the repo root:
+    python -m tools.lead_lyrics SOURCE_DIR [DEST_DIR] [--offset -0.25] [--offsets offsets.json] [--workers N]
+
+files are transformed in a process pool and written atomically (temp file +
+rename), so DEST_DIR can be SOURCE_DIR and an interrupted run never leaves a
+half written file. a file whose output equals what is already at the
+destination is not written again. in an in place run the workers only
+transform, the main process journals every file (synced to disk) in
+SOURCE_DIR/.lead_lyrics_journal.jsonl before replacing it, and keeps the
+journal until the run is done. a restart after an interruption skips the
+journaled files instead of shifting them twice.
+
+timestamps can be [mm:ss], [mm:ss.xx] or [mm:ss.xxx], each keeps its precision.
+metadata tags ([ar:], [ti:], ...) are kept, an [offset:ms] tag is folded into
+the timestamps and removed, since many players ignore it.
+
+the offsets file is json of paths relative to SOURCE_DIR to offsets in
+seconds, a file path sets the offset of one file, a directory path the offset
+of every file below it (eg. an album), the most specific path wins:
+    {"Artist/Album": -0.5, "Artist/Album/01 Song.lrc": 0.1}
+"""
 import re
-from pathlib import Path
+import os
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path, PurePosixPath
+from concurrent.futures import ProcessPoolExecutor
+from utils.atomic import atomic_write_text
+from utils.lyrics import ms_to_timestamp, timestamp_to_ms
 
-TIME_PATTERN = re.compile(r"\[(\d{2}):(\d{2}\.\d{2})\]")
+TIME_PATTERN = re.compile(r"\[(\d{1,3}):(\d{2})(?:([.:])(\d{1,3}))?\]")
+OFFSET_TAG_PATTERN = re.compile(r"^\[offset:\s*([+-]?\d+)\s*\][ \t]*(?:\r\n|\n|\r)?", flags=re.IGNORECASE | re.MULTILINE)
 
-def shift_lrc_timestamps(src_dir: str,dst_dir: str,offset_seconds: float) -> bool:
-    src = Path(src_dir)
-    dst = Path(dst_dir)
+# file outcomes
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+RESUMED = "resumed"     # shifted by the interrupted run this one resumes
 
-    if not src.is_dir(): raise ValueError(f"Source directory does not exist: {src}")
+# in place runs journal the files they wrote, deleted once a run completes
+JOURNAL_NAME = ".lead_lyrics_journal.jsonl"
 
-    dst.mkdir(parents=True, exist_ok=True)
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def shift_lrc_text(content: str, offset_ms: int) -> str:
+    """shift every timestamp of an .lrc text by offset_ms, clamped at 0
+
+    :param content: .lrc file content
+    :type content: str
+    :param offset_ms: lyrics lead(-ve), lyrics lag(+ve)
+    :type offset_ms: int
+    :return: shifted .lrc content
+    :rtype: str
+    """
+    # [offset:+n] shows lyrics n ms sooner, fold it in
+    for match in OFFSET_TAG_PATTERN.finditer(content):
+        offset_ms -= int(match.group(1))
+    content = OFFSET_TAG_PATTERN.sub("", content)
+    if offset_ms == 0: return content
 
     def replace_time(match: re.Match) -> str:
-        minutes = int(match.group(1))
-        seconds = float(match.group(2))
+        minutes, seconds, separator, fraction = match.groups()
+        ms = max(0, timestamp_to_ms(minutes, seconds, fraction) + offset_ms)
+        timestamp = ms_to_timestamp(ms, digits=len(fraction) if fraction else 0)
+        return f"[{timestamp.replace('.', separator, 1) if separator else timestamp}]"
 
-        total_seconds = minutes * 60 + seconds + offset_seconds
-        if total_seconds < 0:
-            total_seconds = 0.0
+    return TIME_PATTERN.sub(replace_time, content)
 
-        new_minutes = int(total_seconds // 60)
-        new_seconds = total_seconds % 60
+def _transform_file(job: tuple) -> tuple:
+    """process pool worker, shift one file
 
-        return f"[{new_minutes:02d}:{new_seconds:05.2f}]"
+    :param job: (src_path, dst_path, offset_ms, in_place, journaled_sha1)
+    :type job: tuple
+    :return: (src_path, outcome, error, updated), updated is the content the main process writes in place, else None
+    :rtype: tuple
+    """
+    src_path, dst_path, offset_ms, in_place, journaled_sha1 = job
+    try:
+        with open(src_path, "r", encoding="utf-8", newline="") as f:   # newline="" keeps line endings as they are
+            content = f.read()
+        if journaled_sha1 is not None and _sha1(content) == journaled_sha1: return (src_path, RESUMED, None, None)
+        updated = shift_lrc_text(content, offset_ms)
+        if dst_path == src_path: current = content
+        else:
+            try:
+                with open(dst_path, "r", encoding="utf-8", newline="") as f:
+                    current = f.read()
+            except FileNotFoundError: current = None
+        if updated == current: return (src_path, UNCHANGED, None, None)
+        if in_place: return (src_path, CHANGED, None, updated)    # journaled and written by the main process
+        atomic_write_text(dst_path, updated)
+        return (src_path, CHANGED, None, None)
+    except (OSError, UnicodeDecodeError) as e:
+        return (src_path, FAILED, str(e), None)
 
-    for lrc_file in src.glob("*.lrc"):
-        content = lrc_file.read_text(encoding="utf-8")
+def _journal_and_write(journal, dst_path: str, relative_path: str, updated: str):
+    """journal a file, synced to disk, then replace it
 
-        updated = TIME_PATTERN.sub(replace_time, content)
+    if the replace doesn't happen the file won't match its entry and is
+    shifted on resume, if it does it matches and is skipped
+    """
+    journal.write(json.dumps({"path": relative_path, "sha1": _sha1(updated)}) + "\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+    atomic_write_text(dst_path, updated)
 
-        out_path = dst / lrc_file.name
-        out_path.write_text(updated, encoding="utf-8")
-    print("Done")
-    return True
+def load_offsets(offsets_file: str|None) -> dict[PurePosixPath, float]:
+    """read the offsets mapping, relative path -> offset in seconds"""
+    if not offsets_file: return {}
+    with open(offsets_file, "r", encoding="utf-8") as f:
+        return {PurePosixPath(path.strip("/")): float(offset) for path, offset in json.load(f).items()}
 
+def load_journal(journal_file: Path) -> dict[str, str]:
+    """relative path -> sha1 of the content an interrupted in place run wrote there"""
+    if not journal_file.exists(): return {}
+    journaled = {}
+    with open(journal_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try: entry = json.loads(line)
+            except ValueError: continue     # line cut off by the interruption
+            journaled[entry["path"]] = entry["sha1"]
+    return journaled
 
-# you can replace original .lrc files by making 'DEST_DIR = SOURCE_DIR'
+def offset_for(relative_path: PurePosixPath, offsets: dict[PurePosixPath, float], default_s: float) -> float:
+    """offset of a file, from its own entry, else its nearest directory entry, else default_s"""
+    for path in (relative_path, *relative_path.parents):
+        if path in offsets: return offsets[path]
+    return default_s
+
+def shift_lrc_timestamps(src_dir: str, dst_dir: str, offset_seconds: float, offsets_file: str|None = None, workers: int|None = None) -> bool:
+    """shift timestamps of every .lrc below src_dir, written to the same relative path below dst_dir
+
+    :param src_dir: library with .lrc files, searched recursively
+    :type src_dir: str
+    :param dst_dir: output directory, can be src_dir to shift in place
+    :type dst_dir: str
+    :param offset_seconds: lyrics lead(-ve), lyrics lag(+ve), for files without an entry in offsets_file
+    :type offset_seconds: float
+    :param offsets_file: json mapping of relative file/directory paths to offsets in seconds
+    :type offsets_file: str | None
+    :param workers: worker processes, None = cpu count
+    :type workers: int | None
+    :return: True if every file was processed
+    :rtype: bool
+    """
+    src = Path(src_dir)
+    dst = Path(dst_dir)
+
+    if not src.is_dir(): raise ValueError(f"Source directory does not exist: {src}")
+
+    offsets = load_offsets(offsets_file)
+    in_place = dst.resolve() == src.resolve()
+    if in_place: dst = src  # same path strings, src_path == dst_path
+    journal_file = src / JOURNAL_NAME if in_place else None
+    journaled = load_journal(journal_file) if in_place else {}
+    if journaled: print(f"Resuming an interrupted run: {len(journaled)} journaled files are skipped if already shifted")
+
+    jobs = []
+    for lrc_file in src.rglob("*.lrc"):
+        relative_path = lrc_file.relative_to(src)
+        offset_s = offset_for(PurePosixPath(relative_path.as_posix()), offsets, default_s=offset_seconds)
+        dst_path = str(dst / relative_path)
+        jobs.append((str(lrc_file), dst_path, round(offset_s * 1000), in_place, journaled.get(relative_path.as_posix())))
+
+    counts = {CHANGED: 0, UNCHANGED: 0, RESUMED: 0, FAILED: 0}
+    # only this process writes the journal
+    journal = open(journal_file, "a", encoding="utf-8") if in_place else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for src_path, outcome, error, updated in executor.map(_transform_file, jobs, chunksize=64):
+                if updated is not None:
+                    try: _journal_and_write(journal, src_path, Path(src_path).relative_to(src).as_posix(), updated)
+                    except OSError as e: outcome, error = FAILED, str(e)
+                counts[outcome] += 1
+                if error is not None: print(f"FAILURE - {src_path}: {error}")
+    finally:
+        if journal is not None: journal.close()
+
+    print(f"Done: {counts[CHANGED]} changed, {counts[UNCHANGED]} unchanged, {counts[RESUMED]} resumed, {counts[FAILED]} failed")
+    if counts[FAILED] == 0 and journal_file is not None and journal_file.exists():
+        journal_file.unlink()   # complete, a later run shifts everything again
+    return counts[FAILED] == 0
+
+
+# original .lrc files are replaced when no DEST_DIR is given
 if __name__ == "__main__":
     SOURCE_DIR = r"C:\\Users\\Max\\Desktop\\music\\found"
-    DEST_DIR = r"C:\\Users\\Max\\Desktop\\music\\found"
+    OFFSET_SECONDS = -0.25 # Recommended: -0.25
+
+    parser = argparse.ArgumentParser(description="shift .lrc timestamps of a library")
+    parser.add_argument("src_dir", nargs="?", default=SOURCE_DIR)
+    parser.add_argument("dst_dir", nargs="?", default=None, help="defaults to src_dir (in place)")
+    parser.add_argument("--offset", type=float, default=OFFSET_SECONDS, help="seconds, lyrics lead(-ve), lyrics lag(+ve)")
+    parser.add_argument("--offsets", default=None, help="json of per file/album offsets")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
     # offset = lyrics lead(-ve), lyrics lag(+ve)
-    shift_lrc_timestamps(src_dir=SOURCE_DIR, dst_dir=DEST_DIR, offset_seconds=-0.25) # Recommended: -0.25
\ No newline at end of file
+    ok = shift_lrc_timestamps(src_dir=args.src_dir, dst_dir=args.dst_dir or args.src_dir, offset_seconds=args.offset, offsets_file=args.offsets, workers=args.workers)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,65 @@
+"""
+build the search index of an lrclib database dump for the local lrclib provider, run from the repo root:
+    python -m tools.lrclib_index [DUMP_FILE] [INDEX_FILE] [--force]
+
+the dump is only read, the trigram full-text index over track, artist and
+album names of the tracks with lyrics goes to its own file (LRCLIB_INDEX_FILE).
+build it again after downloading a new dump.
+"""
+import sys
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from config import LRCLIB_DB_FILE, LRCLIB_INDEX_FILE
+
+# contentless, rowid = tracks.id of the dump
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE tracks_fts USING fts5(
+    name, artist_name, album_name,
+    content='', tokenize='trigram'
+)
+"""
+
+def build_index(dump_file: str, index_file: str, force: bool = False) -> int:
+    """index the names of every track that has lyrics
+
+    :param dump_file: lrclib dump, or a sqlite file in the same schema
+    :type dump_file: str
+    :param index_file: output sqlite file
+    :type index_file: str
+    :param force: replace an existing index file
+    :type force: bool
+    :return: number of tracks indexed
+    :rtype: int
+    """
+    if not Path(dump_file).exists(): raise ValueError(f"Dump file not found: {dump_file}")
+    if Path(index_file).exists():
+        if not force: raise ValueError(f"Index file already exists: {index_file}, use --force to rebuild it")
+        Path(index_file).unlink()
+    conn = sqlite3.connect(f"file:{index_file}", uri=True)   # uri, so the dump can be attached read only
+    try:
+        conn.execute("ATTACH DATABASE ? AS dump", (f"file:{dump_file}?mode=ro",))
+        conn.execute(FTS_SCHEMA)
+        conn.execute("""
+            INSERT INTO tracks_fts(rowid, name, artist_name, album_name)
+            SELECT id, name, artist_name, album_name FROM dump.tracks WHERE last_lyrics_id IS NOT NULL
+        """)
+        conn.commit()
+        return conn.execute("SELECT count(*) FROM tracks_fts_docsize").fetchone()[0]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="build the search index of an lrclib database dump")
+    parser.add_argument("dump_file", nargs="?", default=LRCLIB_DB_FILE)
+    parser.add_argument("index_file", nargs="?", default=LRCLIB_INDEX_FILE)
+    parser.add_argument("--force", action="store_true", help="replace an existing index")
+    args = parser.parse_args()
+    if not args.dump_file: parser.error("no dump file given and LRCLIB_DB_FILE is not set")
+
+    start = time.time()
+    indexed = build_index(args.dump_file, args.index_file, force=args.force)
+    print(f"Done: {indexed} tracks indexed to {args.index_file} in {time.time() - start:0.2f}s")
+    sys.exit(0)
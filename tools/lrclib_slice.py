@@ -0,0 +1,49 @@
+"""
+copy a slice of an lrclib database dump into a small sqlite file of the same schema,
+for trying the local lrclib provider offline. run from the repo root:
+    python -m tools.lrclib_slice DUMP_FILE SLICE_FILE [--rows 10000]
+"""
+import sys
+import sqlite3
+import argparse
+from pathlib import Path
+
+def make_slice(dump_file: str, slice_file: str, rows: int) -> int:
+    """copy the first rows tracks that have lyrics, with their lyrics
+
+    :param dump_file: lrclib database dump
+    :type dump_file: str
+    :param slice_file: output sqlite file, must not exist
+    :type slice_file: str
+    :param rows: number of tracks to copy
+    :type rows: int
+    :return: number of tracks copied
+    :rtype: int
+    """
+    if Path(slice_file).exists(): raise ValueError(f"Slice file already exists: {slice_file}")
+    conn = sqlite3.connect(slice_file)
+    try:
+        conn.execute("ATTACH DATABASE ? AS dump", (dump_file,))
+        for (sql,) in conn.execute("SELECT sql FROM dump.sqlite_master WHERE type = 'table' AND name IN ('tracks', 'lyrics')").fetchall():
+            conn.execute(sql)
+        conn.execute("""
+            INSERT INTO tracks SELECT * FROM dump.tracks
+            WHERE last_lyrics_id IS NOT NULL ORDER BY id LIMIT ?
+        """, (rows,))
+        conn.execute("INSERT INTO lyrics SELECT * FROM dump.lyrics WHERE id IN (SELECT last_lyrics_id FROM tracks)")
+        conn.commit()
+        return conn.execute("SELECT count(*) FROM tracks").fetchone()[0]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="copy a slice of an lrclib database dump")
+    parser.add_argument("dump_file")
+    parser.add_argument("slice_file")
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    copied = make_slice(args.dump_file, args.slice_file, rows=args.rows)
+    print(f"Done: {copied} tracks copied to {args.slice_file}")
+    sys.exit(0)
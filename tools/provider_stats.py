@@ -0,0 +1,44 @@
+"""
+inspect the provider stats learned provider ordering uses, run from the repo root:
+    python -m tools.provider_stats [--bucket script:] [--song SONG_FILE ...] [--fetch-mode 2]
+
+lists lookups, synced and unsynced hit rates and mean latency per feature
+bucket and provider, --song shows the lookup order a song would get under
+--fetch-mode and which buckets decided it.
+"""
+import sys
+import argparse
+from config import PROVIDER_STATS_FILE, PROVIDER_STATS_MIN_LOOKUPS, LYRICS_FETCH_MODE
+from utils.provider_stats import ProviderStats
+from utils.helpers import read_song_metadata
+from utils.fetch.registry import configured_providers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="inspect provider stats")
+    parser.add_argument("--db", default=PROVIDER_STATS_FILE, help="provider stats file")
+    parser.add_argument("--bucket", default="", help="only buckets starting with this, eg. script: or albumartist:")
+    parser.add_argument("--song", nargs="*", default=[], help="show the lookup order of these songs")
+    parser.add_argument("--fetch-mode", type=int, default=LYRICS_FETCH_MODE, help="synced[0], unsynced[1], synced_with_fallback[2]")
+    args = parser.parse_args()
+
+    if not args.db:
+        print("PROVIDER_STATS_FILE is not set")
+        sys.exit(1)
+    stats = ProviderStats(db_path=args.db, min_lookups=PROVIDER_STATS_MIN_LOOKUPS)
+
+    if not args.song:
+        print(f"{'bucket':<48} {'provider':<12} {'lookups':>8} {'synced':>8} {'unsynced':>9} {'latency':>9}")
+        for bucket, provider, lookups, synced_hits, unsynced_hits, total_s in stats.rows(bucket_prefix=args.bucket):
+            print(f"{bucket[:48]:<48} {provider:<12} {lookups:>8} {synced_hits / lookups * 100:>7.1f}% {unsynced_hits / lookups * 100:>8.1f}% {total_s / lookups:>8.2f}s")
+        sys.exit(0)
+
+    providers = list(configured_providers())
+    for song_path in args.song:
+        song = read_song_metadata(song_path)
+        print(f"{song.path.name}: {' > '.join(stats.order(song, providers, fetch_mode=args.fetch_mode))}")
+        for provider in providers:
+            synced_rate, latency_s, bucket = stats.estimate(song, provider, "synced")
+            unsynced_rate, _, _ = stats.estimate(song, provider, "unsynced")
+            print(f"    {provider:<12} synced {synced_rate * 100:5.1f}% unsynced {unsynced_rate * 100:5.1f}% latency {latency_s:6.2f}s ({bucket or 'prior'})")
+    sys.exit(0)
@@ -0,0 +1,41 @@
+"""
+serve a recorded cassette as a stand-in for the lyrics providers, run from the repo root:
+    python -m tools.replay_server CASSETTE_FILE [--port 8765] [--latency-ms 0] [--jitter-ms 0] [--error-rate 0] [--throttle-rate 0]
+
+record a cassette with HTTP_CASSETTE_MODE = 1, then replay it with
+HTTP_CASSETTE_MODE = 2 and HTTP_REPLAY_URL pointing at this server.
+"""
+import sys
+import argparse
+from utils.cassette import ReplayServer, load_cassette
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve a recorded cassette of provider responses")
+    parser.add_argument("cassette_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 = any free port")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random extra delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 503 [0-1]")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="share of requests answered with 429 [0-1]")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        load_cassette(args.cassette_file),
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    # first line of output, read by tools/bench_pipeline.py
+    print(f"Serving {len(server.interactions)} interactions at {server.url}", flush=True)
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+    finally: server.stop()
+    print(f"Done: {server.served} served, {server.missed} missed")
+    sys.exit(0)
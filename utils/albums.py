@@ -0,0 +1,114 @@
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator
+from utils.helpers import SongMetadata
+from config import ALBUM_BATCHING, ALBUM_MIN_TRACKS, ALBUM_CACHE_SIZE, ALBUM_MAX_GROUP
+
+log = logging.getLogger(__name__)
+
+# songs seen per album in this run, filled by group_by_album
+_album_members: dict[tuple, int] = {}
+_album_members_lock = threading.Lock()
+
+
+def album_key(song: SongMetadata) -> tuple|None:
+    """(album artist, album) of a song, the artist stands in for a missing album artist, None without an album"""
+    if not song.album: return None
+    return (song.albumartist or song.artist, song.album)
+
+def album_query(song: SongMetadata) -> str:
+    """raw album and album artist tags, as a search query"""
+    _, artist, album, albumartist = song.raw_tags
+    return f"{album} {albumartist or artist}".strip()
+
+def group_by_album(scanned: Iterable[tuple]) -> Iterator[tuple]:
+    """pass scanned songs through, keeping consecutive songs of an album together and counting them
+
+    the library walk already yields an album folder in one run, so songs are
+    buffered only until the album changes (or ALBUM_MAX_GROUP songs), and a
+    provider can tell from worth_album_lookup whether an album lookup pays off.
+
+    :param scanned: (song_path, SongMetadata, exception) tuples from the library scanner
+    :type scanned: Iterable[tuple]
+    :return: the same tuples
+    :rtype: Iterator[tuple]
+    """
+    group = []
+    group_key = None
+
+    def flush() -> list:
+        if group_key is not None:
+            with _album_members_lock:
+                _album_members[group_key] = _album_members.get(group_key, 0) + len(group)
+        return group
+
+    for item in scanned:
+        song = item[1]
+        key = album_key(song) if song is not None else None
+        if key is None:     # nothing to batch, don't hold it back
+            yield item
+            continue
+        if key != group_key or len(group) >= ALBUM_MAX_GROUP:
+            yield from flush()
+            group, group_key = [], key
+        group.append(item)
+    yield from flush()
+
+def worth_album_lookup(song: SongMetadata) -> bool:
+    """True if enough songs of the album are in this run for one album lookup to replace their searches"""
+    if not ALBUM_BATCHING: return False
+    key = album_key(song)
+    if key is None: return False
+    with _album_members_lock:
+        return _album_members.get(key, 0) >= ALBUM_MIN_TRACKS
+
+class AlbumCache:
+    """track lists of albums, resolved once per album and shared by its songs
+
+    concurrent songs of one album wait for a single lookup instead of each
+    searching on their own. failed lookups (None) are cached too, so the
+    songs fall back to their own search without retrying the album.
+    """
+    def __init__(self, name: str, max_albums: int = ALBUM_CACHE_SIZE):
+        self.name = name
+        self.max_albums = max_albums
+        self._albums: OrderedDict[tuple, object] = OrderedDict()
+        self._locks: dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.reused = 0
+
+    def get(self, key: tuple, resolve: Callable[[], object]) -> object:
+        """track list of an album, resolve() is called once per album
+
+        :param key: album key
+        :type key: tuple
+        :param resolve: album lookup, returns the track list or None if the album was not found
+        :type resolve: Callable
+        :return: the resolved track list, None if not found
+        :rtype: object
+        """
+        with self._lock:
+            if key in self._albums:
+                self._albums.move_to_end(key)
+                self.reused += 1
+                return self._albums[key]
+            album_lock = self._locks.setdefault(key, threading.Lock())
+
+        with album_lock:
+            with self._lock:    # resolved while waiting for the album lock
+                if key in self._albums:
+                    self.reused += 1
+                    return self._albums[key]
+            try:
+                tracks = resolve()
+                with self._lock:
+                    self.lookups += 1
+                    self._albums[key] = tracks
+                    while len(self._albums) > self.max_albums:
+                        self._albums.popitem(last=False)
+            finally:
+                with self._lock: self._locks.pop(key, None)
+        log.info(f"ALBUM - {self.name}: {key[1]!r} {'resolved' if tracks is not None else 'not found'}")
+        return tracks
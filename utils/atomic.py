@@ -0,0 +1,25 @@
+import os
+import tempfile
+from pathlib import Path
+
+def atomic_write_text(path: str|Path, text: str, encoding: str = "utf-8"):
+    """write text to a temp file next to path and rename it over path
+
+    a reader (or an interrupted run) never sees a half written file.
+
+    :param path: destination file
+    :type path: str | Path
+    :param text: file content
+    :type text: str
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline="") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
@@ -0,0 +1,88 @@
+import sqlite3
+import json
+import threading
+import time
+import logging
+from utils.lyrics import Lyrics
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    provider TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    synced_lyrics TEXT,
+    unsynced_lyrics TEXT,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (provider, fingerprint)
+)
+"""
+
+def _encode(lyrics: Lyrics|bool) -> str|None:
+    return json.dumps(lyrics.to_dict(), ensure_ascii=False) if lyrics is not False else None
+
+def _decode(value: str|None) -> Lyrics|bool:
+    return Lyrics.from_dict(json.loads(value)) if value is not None else False
+
+class ResultCache:
+    """persistent provider result cache, stores hits and misses
+
+    entries are keyed by provider name plus tag fingerprint (search query).
+    misses expire after their own ttl so they get rechecked later. lyrics are
+    stored as json of the structured lines, not as rendered text.
+    """
+    def __init__(self, db_path: str, hit_ttl_s: float, miss_ttl_s: float):
+        self.hit_ttl_s = hit_ttl_s
+        self.miss_ttl_s = miss_ttl_s
+        self._lock = threading.Lock()   # one connection shared by song workers
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, provider: str, fingerprint: str) -> tuple|None:
+        """get a cached result
+
+        :return: (synced_lyrics, unsynced_lyrics) items can be Lyrics|False, None if not cached or expired
+        :rtype: tuple | None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_lyrics, unsynced_lyrics, fetched_at FROM results WHERE provider = ? AND fingerprint = ?",
+                (provider, fingerprint),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            synced_lyrics, unsynced_lyrics, fetched_at = row
+            found = synced_lyrics is not None or unsynced_lyrics is not None
+            ttl_s = self.hit_ttl_s if found else self.miss_ttl_s
+            if time.time() - fetched_at > ttl_s:
+                self.misses += 1
+                return None
+            try: result = (_decode(synced_lyrics), _decode(unsynced_lyrics))
+            except (ValueError, KeyError, TypeError):
+                self.misses += 1    # rendered text from an older version, fetch again
+                return None
+            self.hits += 1
+        return result
+
+    def put(self, provider: str, fingerprint: str, result: tuple):
+        """store a (synced_lyrics, unsynced_lyrics) result, False items are stored as misses"""
+        synced_lyrics, unsynced_lyrics = result
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (provider, fingerprint,
+                 _encode(synced_lyrics),
+                 _encode(unsynced_lyrics),
+                 time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        log.info(f"==== Result cache was closed ({self.hits} hits, {self.misses} misses) ====")
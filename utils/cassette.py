@@ -0,0 +1,143 @@
+import json
+import random
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+
+log = logging.getLogger(__name__)
+
+# header carrying the original url of a request sent to the replay server
+CASSETTE_URL_HEADER = "X-Cassette-Url"
+# query parameters that don't change the answer, eg. lrclib's random search limit
+IGNORED_PARAMS = {"limit"}
+
+
+def cassette_key(url: str, params: dict|None = None) -> str:
+    """the url a GET is recorded/replayed under: prepared like requests sends it, params sorted"""
+    prepared = requests.Request("GET", url, params=params).prepare().url
+    parts = urlsplit(prepared)
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key not in IGNORED_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+class CassetteRecorder:
+    """appends provider responses to a json lines cassette, one interaction per line"""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, key: str, response: requests.Response):
+        entry = {
+            "key": key,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "body": response.text,
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+def load_cassette(path: str) -> dict[str, dict]:
+    """key -> recorded interaction, a later recording of a key wins"""
+    interactions = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                interactions[entry["key"]] = entry
+    return interactions
+
+class ReplayServer:
+    """local http server answering requests from a cassette
+
+    requests carry their original url in the X-Cassette-Url header. unknown
+    urls get a 404 with an empty json body. latency and errors can be
+    injected to see how the pipeline behaves against slow or flaky providers.
+    """
+    def __init__(self, interactions: dict[str, dict], host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, throttle_rate: float = 0, seed: int|None = None):
+        """
+        :param interactions: cassette, from load_cassette
+        :type interactions: dict[str, dict]
+        :param port: 0 = any free port
+        :type port: int
+        :param latency_ms: delay added to every response
+        :type latency_ms: float
+        :param jitter_ms: random extra delay, up to this much
+        :type jitter_ms: float
+        :param error_rate: share of requests answered with 503 [0-1]
+        :type error_rate: float
+        :param throttle_rate: share of requests answered with 429 [0-1]
+        :type throttle_rate: float
+        """
+        self.interactions = interactions
+        self.latency_s = latency_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.served = 0
+        self.missed = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread|None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, like the real providers
+            disable_nagle_algorithm = True  # headers and body go out in separate writes, don't hold the body back
+
+            def do_GET(self):
+                with server._random_lock:
+                    delay_s = server.latency_s + server._random.random() * server.jitter_s
+                    roll = server._random.random()
+                if delay_s: time.sleep(delay_s)
+                key = self.headers.get(CASSETTE_URL_HEADER, "")
+                entry = server.interactions.get(key)
+                if roll < server.error_rate:
+                    self._send(503, "text/plain", "injected error")
+                elif roll < server.error_rate + server.throttle_rate:
+                    self._send(429, "text/plain", "injected throttle", extra_headers={"Retry-After": "1"})
+                elif entry is None:
+                    server.missed += 1
+                    self._send(404, "application/json", "{}")
+                else:
+                    server.served += 1
+                    self._send(entry["status"], entry["content_type"], entry["body"])
+
+            def _send(self, status: int, content_type: str, body: str, extra_headers: dict|None = None):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type or "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (extra_headers or {}).items(): self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        log.info(f"==== Replay server is serving {len(self.interactions)} interactions at {self.url} ====")
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,130 @@
+import threading
+import time
+import logging
+from collections import deque
+from config import BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_FAILURE_RATE, BREAKER_SLOW_CALL_S, BREAKER_OPEN_S
+
+log = logging.getLogger(__name__)
+
+# breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitOpen(Exception):
+    """a provider is skipped because its breaker is open"""
+    def __init__(self, provider: str, retry_in_s: float):
+        self.provider = provider
+        self.retry_in_s = retry_in_s
+        super().__init__(f"{provider} circuit open, probing again in {retry_in_s:0.0f}s")
+
+class CircuitBreaker:
+    """stops calling a provider that keeps failing or timing out
+
+    closed: lookups go through, the outcome of the last `window` lookups is
+    kept. once enough of them failed (an exception, or slower than
+    slow_call_s) the breaker opens and lookups are skipped for open_s. then a
+    single probe lookup is let through (half-open), it closes the breaker on
+    success and opens it again on failure.
+
+    fetchers raise on outages (the transport raises on connection errors and
+    5xx), a (False, False) result is a lookup that worked and found nothing.
+    """
+    def __init__(self, name: str, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE, slow_call_s: float|None = BREAKER_SLOW_CALL_S, open_s: float = BREAKER_OPEN_S):
+        """
+        :param name: provider name
+        :type name: str
+        :param window: lookups the failure rate is taken over
+        :type window: int
+        :param min_calls: lookups needed in the window before the breaker can open
+        :type min_calls: int
+        :param failure_rate: share of failed lookups that opens the breaker [0-1]
+        :type failure_rate: float
+        :param slow_call_s: a lookup slower than this counts as failed, None = only exceptions
+        :type slow_call_s: float | None
+        :param open_s: time lookups are skipped before the next probe
+        :type open_s: float
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.open_s = open_s
+        self.state = CLOSED
+        self.skipped = 0
+        self.trips = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = failed
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """check that a lookup may go through
+
+        :raises CircuitOpen: if the breaker is open, or half-open with its probe already running
+        """
+        with self._lock:
+            if self.state == CLOSED: return
+            retry_in_s = self._opened_at + self.open_s - time.monotonic()
+            if self.state == OPEN and retry_in_s <= 0:
+                self._transition(HALF_OPEN, "probing")
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.skipped += 1
+        raise CircuitOpen(self.name, retry_in_s=max(0.0, retry_in_s))
+
+    def record(self, duration_s: float, failed: bool = False):
+        """outcome of a lookup that went through
+
+        :param duration_s: lookup duration
+        :type duration_s: float
+        :param failed: True if the lookup raised
+        :type failed: bool
+        """
+        failed = failed or (self.slow_call_s is not None and duration_s > self.slow_call_s)
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failed: self._open("probe failed")
+                else:
+                    self._outcomes.clear()
+                    self._transition(CLOSED, "probe succeeded")
+                return
+            self._outcomes.append(failed)
+            failures = sum(self._outcomes)
+            if self.state == CLOSED and len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open(f"{failures}/{len(self._outcomes)} lookups failed")
+
+    def release(self):
+        """a lookup that went through ended without an outcome (eg. throttled), let the next one probe"""
+        with self._lock:
+            if self.state == HALF_OPEN: self._probing = False
+
+    def _open(self, reason: str):
+        self._opened_at = time.monotonic()
+        self.trips += 1
+        self._transition(OPEN, f"{reason}, skipped for {self.open_s:0.0f}s")
+
+    def _transition(self, state: str, reason: str):
+        log.warning(f"BREAKER - {self.name}: {self.state} -> {state} ({reason})")
+        self.state = state
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """shared breaker of a provider"""
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider)
+        return _breakers[provider]
+
+def breaker_report() -> list[str]:
+    """one line per provider that tripped or skipped lookups"""
+    return [
+        f"{name}: {breaker.state}, tripped {breaker.trips}x, {breaker.skipped} lookups skipped"
+        for name, breaker in _breakers.items() if breaker.trips or breaker.skipped
+    ]
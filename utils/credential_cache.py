@@ -0,0 +1,40 @@
+import json
+import threading
+import logging
+from pathlib import Path
+from utils.atomic import atomic_write_text
+
+log = logging.getLogger(__name__)
+
+class CredentialCache:
+    """small json file of credentials reused across runs
+
+    the file is re-read on every get, so a value written by another process
+    is picked up. writes go to a temp file that is renamed over the cache, so
+    a reader never sees a half written file.
+    """
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning(f"IGNORED - unreadable credential cache {self.path}: {e}")
+            return {}
+
+    def get(self, key: str) -> dict|None:
+        """get a cached entry, None if missing"""
+        with self._lock:
+            return self._read().get(key)
+
+    def set(self, key: str, value: dict):
+        """store an entry and write the cache atomically"""
+        with self._lock:
+            data = self._read()
+            data[key] = value
+            atomic_write_text(self.path, json.dumps(data, indent=2))
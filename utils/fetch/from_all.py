@@ -1,62 +1,238 @@
-from utils.fetch.musixmatch import fetch_lyrics as fetch_musixmatch
-from utils.fetch.lrclib import fetch_lyrics as fetch_lrclib
-from utils.fetch.genius import fetch_lyrics as fetch_genius
-from utils.fetch.jiosaavn import fetch_lyrics as fetch_jiosaavn
-from utils.helpers import get_songs
+from utils.fetch.registry import configured_providers
+from utils.scanner import walk_audio_files
+from utils.helpers import read_song_metadata, SongMetadata, setup_logging
+from utils.cache import ResultCache
+from utils.rate_limit import RateLimited, waited_s
+from utils.circuit_breaker import CircuitOpen, get_breaker
+from utils.provider_stats import ProviderStats
+from utils.lyrics import Lyrics
+from utils.metrics import metrics, HIT, MISS, THROTTLED, SKIPPED
+from config import PROVIDER_CONCURRENCY, PROVIDER_FANOUT, RESULT_CACHE_FILE, RESULT_CACHE_HIT_TTL_DAYS, RESULT_CACHE_MISS_TTL_DAYS
+from config import PROVIDER_ORDERING, PROVIDER_STATS_FILE, PROVIDER_STATS_MIN_LOOKUPS
+from config import INCREMENTAL_MODE, RETRY_FAILED_AFTER_HOURS
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable
+import threading
+import time
 import logging
 
 log = logging.getLogger(__name__)
 
-SOURCE_FETCHERS = {
-    "MusixMatch": fetch_musixmatch,
-    "Lrclib": fetch_lrclib,
-    "Genius": fetch_genius,
-    "JioSaavn": fetch_jiosaavn,
+# configured providers in priority order, each one is set up on first use
+SOURCE_FETCHERS = configured_providers()
+
+# per-provider concurrency caps, shared by every song worker
+_provider_slots = {
+    source_name: threading.BoundedSemaphore(PROVIDER_CONCURRENCY.get(source_name, 1))
+    for source_name in SOURCE_FETCHERS
+}
+
+# fan-out workers, one pool per provider sized to its cap so a busy provider never starves the others
+_provider_pools = {
+    source_name: ThreadPoolExecutor(max_workers=PROVIDER_CONCURRENCY.get(source_name, 1), thread_name_prefix=source_name)
+    for source_name in SOURCE_FETCHERS
 }
 
 
-def fetch_lyrics(song_path:str, fetch_mode:int) -> str|bool:
+def open_result_cache() -> ResultCache|None:
+    """result cache per config, None if disabled. opened by the run, not on import"""
+    if not RESULT_CACHE_FILE: return None
+    return ResultCache(
+        db_path=RESULT_CACHE_FILE,
+        hit_ttl_s=RESULT_CACHE_HIT_TTL_DAYS * 86400,
+        # a song retried by an incremental run must not just get its cached misses back
+        miss_ttl_s=min(RESULT_CACHE_MISS_TTL_DAYS * 86400, RETRY_FAILED_AFTER_HOURS * 3600) if INCREMENTAL_MODE else RESULT_CACHE_MISS_TTL_DAYS * 86400,
+    )
+
+def open_provider_stats() -> ProviderStats|None:
+    """hit rate and latency of every lookup, for learned provider ordering. opened by the run, not on import
+
+    None with the fixed priority order, nothing would read the stats
+    """
+    if PROVIDER_ORDERING != 1: return None
+    return ProviderStats(db_path=PROVIDER_STATS_FILE, min_lookups=PROVIDER_STATS_MIN_LOOKUPS)
+
+
+def _call_source(source_name:str, song:SongMetadata, result_cache:ResultCache|None = None, provider_stats:ProviderStats|None = None) -> tuple:
+    """call a single source within its concurrency cap, through the result cache and its circuit breaker
+
+    the cache is keyed by the normalized tag fingerprint of the song (search query).
+    a source that raises failed, it trips the breaker and nothing is cached
+
+    :param result_cache: cache of source results, None = no caching
+    :type result_cache: ResultCache | None
+    :param provider_stats: stats the lookup is recorded to, None = not recorded
+    :type provider_stats: ProviderStats | None
+    :return: (synced_lyrics, unsynced_lyrics) items can be Lyrics|False
+    :rtype: tuple
+    :raises CircuitOpen: if the source is skipped by its breaker
+    """
+    with metrics.context(song=song.path.name, provider=source_name), metrics.span("lookup") as span:
+        if result_cache is not None:
+            with metrics.span("cache") as cache_span:
+                cached = result_cache.get(source_name, song.query)
+                cache_span.outcome = HIT if cached is not None else MISS
+            if cached is not None:
+                span.outcome = HIT if cached != (False, False) else MISS
+                return cached
+
+        breaker = get_breaker(source_name)
+        try: breaker.before_call()
+        except CircuitOpen:
+            span.outcome = SKIPPED
+            raise
+        try:
+            with _provider_slots[source_name]:
+                # timed once the slot is held, limiter waits are taken out below
+                start, start_waited_s = time.monotonic(), waited_s()
+                result = SOURCE_FETCHERS[source_name](song=song)
+        except RateLimited:
+            breaker.release()
+            span.outcome = THROTTLED
+            raise
+        except Exception:
+            duration_s = time.monotonic() - start
+            breaker.record(duration_s - (waited_s() - start_waited_s), failed=True)
+            if provider_stats is not None: provider_stats.record(song, source_name, synced=False, unsynced=False, duration_s=duration_s)
+            raise
+        duration_s = time.monotonic() - start
+        # waiting for rate limiter tokens isn't a slow provider
+        breaker.record(duration_s - (waited_s() - start_waited_s))
+        span.outcome = HIT if result != (False, False) else MISS
+        if provider_stats is not None: provider_stats.record(song, source_name, synced=result[0] is not False, unsynced=result[1] is not False, duration_s=duration_s)
+
+        if result_cache is not None:
+            result_cache.put(source_name, song.query, result)
+        return result
+
+def _pick_lyrics(source_name:str, synced_lyrics:Lyrics|bool, unsynced_lyrics:Lyrics|bool, fetch_mode:int) -> Lyrics|bool:
+    """pick lyrics acceptable under fetch_mode from a single source result
+
+    :return: lyrics if acceptable, otherwise False
+    :rtype: Lyrics | bool
+    """
+    match fetch_mode:
+        case 0: # synced only
+            if synced_lyrics is not False:
+                log.info(f"SUCCESS - {source_name}: synced lyrics found")
+                return synced_lyrics
+        case 1: # unsynced only
+            if unsynced_lyrics is not False:
+                log.info(f"SUCCESS - {source_name}: unsynced lyrics found")
+                return unsynced_lyrics
+        case _: # Default: synced with fallback
+            if synced_lyrics is not False:
+                log.info(f"SUCCESS - {source_name}: synced lyrics found")
+                return synced_lyrics
+            if unsynced_lyrics is not False:
+                log.info(f"SUCCESS - {source_name}: unsynced lyrics found")
+                return unsynced_lyrics
+    log.info(f"FAILURE - {source_name}: synced/unsynced lyrics not found")
+    return False
+
+def _first_acceptable(results:Iterable[tuple[str, Callable]], fetch_mode:int) -> tuple:
+    """walk (source_name, get_result) pairs in priority order, return the first acceptable lyrics
+
+    a throttled source is skipped, if no other source has lyrics the song is
+    handed back for a retry instead of being reported as not found. a failing
+    source doesn't stop the others, its error is raised only if none of them
+    has lyrics. a source with an open circuit breaker is skipped.
+
+    :return: (lyrics, source_name) tuple, (False, None) if not found
+    :rtype: tuple
+    :raises RateLimited: if nothing was found and at least one source was throttled
+    :raises Exception: the first source error, if nothing was found and no source was throttled
+    """
+    throttled = []
+    errors = []
+    for source_name, get_result in results:
+        try: synced_lyrics, unsynced_lyrics = get_result()
+        except RateLimited as e:
+            log.info(f"THROTTLED - {source_name}: {e}")
+            throttled.append(e)
+            continue
+        except CircuitOpen as e:
+            log.info(f"SKIPPED - {source_name}: {e}")
+            continue
+        except Exception as e:
+            log.info(f"ERROR - {source_name}: {e!r}")
+            errors.append(e)
+            continue
+        lyrics = _pick_lyrics(source_name, synced_lyrics, unsynced_lyrics, fetch_mode=fetch_mode)
+        if lyrics is not False:
+            return (lyrics, source_name)
+
+    if throttled:
+        retry_after_s = max(e.retry_after_s or 0 for e in throttled) or None
+        raise RateLimited(", ".join(e.provider for e in throttled), retry_after_s=retry_after_s)
+    if errors: raise errors[0]
+    return (False, None)
+
+def _fetch_fanout(song:SongMetadata, fetch_mode:int, result_cache:ResultCache|None, provider_stats:ProviderStats|None) -> tuple:
+    """query all sources at once, return the highest priority acceptable lyrics
+
+    sources are awaited in priority order, so a song only waits for the
+    slowest source that can still win. once a source wins, queued lookups of
+    lower priority sources are cancelled and running ones are discarded.
+    """
+    futures = {
+        source_name: _provider_pools[source_name].submit(_call_source, source_name, song, result_cache, provider_stats)
+        for source_name in SOURCE_FETCHERS
+    }
+    try:
+        return _first_acceptable(((source_name, future.result) for source_name, future in futures.items()), fetch_mode=fetch_mode)
+    finally:
+        for future in futures.values(): future.cancel()
+
+def fetch_lyrics_with_source(song:SongMetadata, fetch_mode:int, result_cache:ResultCache|None = None, provider_stats:ProviderStats|None = None) -> tuple:
+    """fetch lyrics from all sources, along with the source that found them
+
+    sources are asked in priority order, or by expected time to success with
+    PROVIDER_ORDERING = 1. fan-out always keeps the priority order.
+
+    :param song: song metadata
+    :type song: SongMetadata
+    :param fetch_mode: synced[0], unsynced[1], synced_with_fallback[2]
+    :type fetch_mode: int
+    :param result_cache: from open_result_cache, None = no caching
+    :type result_cache: ResultCache | None
+    :param provider_stats: from open_provider_stats, None = lookups aren't recorded and the priority order is kept
+    :type provider_stats: ProviderStats | None
+    :return: (lyrics, source_name) tuple, (False, None) if not found
+    :rtype: tuple
+    :raises RateLimited: if nothing was found and a source was throttled, retry the song later
+    """
+    if PROVIDER_FANOUT:
+        return _fetch_fanout(song=song, fetch_mode=fetch_mode, result_cache=result_cache, provider_stats=provider_stats)
+
+    source_names = list(SOURCE_FETCHERS)
+    if PROVIDER_ORDERING == 1 and provider_stats is not None:  # expected time to success instead of priority
+        source_names = provider_stats.order(song, source_names, fetch_mode=fetch_mode)
+    call_source = partial(_call_source, song=song, result_cache=result_cache, provider_stats=provider_stats)
+    return _first_acceptable(((source_name, partial(call_source, source_name)) for source_name in source_names), fetch_mode=fetch_mode)
+
+def fetch_lyrics(song:SongMetadata, fetch_mode:int) -> Lyrics|bool:
     """fetch lyrics from all sources
 
-    :param song_path: song path
-    :type song_path: str
+    :param song: song metadata
+    :type song: SongMetadata
     :param fetch_mode: synced[0], unsynced[1], synced_with_fallback[2]
     :type fetch_mode: int
     :return: lyrics if found, otherwise False
-    :rtype: str | bool
+    :rtype: Lyrics | bool
     """
-    for source_name, source in SOURCE_FETCHERS.items():  # use source as module
-        synced_lyrics, unsynced_lyrics = source(song_path=song_path)
-
-        match fetch_mode:
-            case 0: # synced only
-                if synced_lyrics is not False:
-                    log.info(f"SUCCESS - {source_name}: synced lyrics found")
-                    return synced_lyrics
-            case 1: # unsynced only
-                if unsynced_lyrics is not False:
-                    log.info(f"SUCCESS - {source_name}: unsynced lyrics found")
-                    return unsynced_lyrics
-            case _: # Default: synced with fallback
-                if synced_lyrics is not False:
-                    log.info(f"SUCCESS - {source_name}: synced lyrics found")
-                    return synced_lyrics
-                if unsynced_lyrics is not False:
-                    log.info(f"SUCCESS - {source_name}: unsynced lyrics found")
-                    return unsynced_lyrics
-        log.info(f"FAILURE - {source_name}: synced/unsynced lyrics not found")
-
-    return False
+    lyrics, _ = fetch_lyrics_with_source(song=song, fetch_mode=fetch_mode)
+    return lyrics
 
 
 
 if __name__ == "__main__":
-    music_files = get_songs("C:\\Users\\Max\\Desktop\\music\\small")
+    setup_logging()
+    music_files = walk_audio_files(roots=["C:\\Users\\Max\\Desktop\\music\\small"])
     for i, song_path in enumerate(music_files):
         print(f"{i+1}. {song_path.stem}")
-        lyrics = fetch_lyrics(song_path=song_path, fetch_mode=2)
+        lyrics = fetch_lyrics(song=read_song_metadata(song_path), fetch_mode=2)
         if lyrics is not False:
             with open(f"lyrics/{song_path.stem}.lrc", "w", encoding="utf-8") as f:
-                f.write(lyrics)
-
-
+                f.write(lyrics.serialize())
@@ -1,52 +1,85 @@
-import requests
 import json
-from utils.helpers import get_songs, build_search_query, match_song_metadata, clean_string
+from utils.scanner import walk_audio_files
+from utils.transport import transport
+from utils.helpers import read_song_metadata, SongMetadata
+from utils.matching import best_match, best_album_match
+from utils.albums import AlbumCache, album_key, album_query, worth_album_lookup
+from functools import partial
+from utils.lyrics import Lyrics
 
 
-def fetch_lyrics(song_path:str)->tuple:
-    headers = {"accept": "*/*"}
+SEARCH_URL = "https://saavn.sumit.co/api/search"
+HEADERS = {"accept": "*/*"}
 
-    query = build_search_query(song_path=song_path)
-    req_url = f"https://saavn.sumit.co/api/search/songs?query={query}"
+# album track lists, one album lookup serves every song of the album
+_albums = AlbumCache("JioSaavn")
 
-    # song search
-    response = requests.get(url=req_url, headers=headers, timeout=30)
+def _get_data(url: str, params: dict) -> dict|None:
+    """get a saavn api response, its "data" or None if the call failed
+
+    params are encoded by the transport, tags can have &, #, + or %
+    """
+    response = transport.get(url, provider="JioSaavn", stage="search", params=params, headers=HEADERS, timeout=30)
     json_data = response.json()
 
     # with open("jiosaavn_response.json", "w", encoding="utf-8") as f:
     #     json.dump(json_data, f, ensure_ascii=False, indent=2)
 
     success = json_data.get("success", bool)
-    if success is False: return (False, False)
-
-    data:dict = json_data.get("data", {})
-    results:list = data.get("results", [])[:10] # top 10 hits
-
-    def eval_results()->dict|bool:
-        try:
-            for result in results:
-                recieved_song_title:str = result.get("name", "")
-                recieved_song_album:str = result.get("album", {}).get("name", "")
-                recieved_song_artists:list = result.get("artists", {}).get("all", [])
-                recieved_song_artist:str = ""
-                for artist in recieved_song_artists:
-                    artist_name = artist.get("name", "")
-                    recieved_song_artist += f"{artist_name} "
-                recieved_song_info = f"{recieved_song_title} {recieved_song_album} {recieved_song_artist}"
-                flag = match_song_metadata(print_match=False, threshold=60, local_song_path=song_path, received_song_info=recieved_song_info)
-                if flag is True:
-                    return result
-            return False    # if no good match is found
-        except: return False    # fail condition
-
-    result = eval_results()
-    if result is False: return (False, False)
+    if success is False: return None
+    return json_data.get("data", {})
+
+def _album_songs(song:SongMetadata) -> list|None:
+    """every song of the album of song, with one album search and one album lookup"""
+    data = _get_data(f"{SEARCH_URL}/albums", params={"query": album_query(song)})
+    if data is None: return None
+    albums:list = data.get("results", [])[:5]
+    recieved_album_infos = [
+        f'{album.get("name", "")} {" ".join(artist.get("name", "") for artist in album.get("artists", {}).get("primary", []))}'
+        for album in albums
+    ]
+    index = best_album_match(song, recieved_album_infos, threshold=60)
+    if index is None: return None
+
+    data = _get_data("https://saavn.sumit.co/api/albums", params={"id": albums[index].get("id", "")})
+    if data is None: return None
+    return data.get("songs", [])
+
+def _best_result(song:SongMetadata, results:list) -> dict|None:
+    """best matching song of search or album results"""
+    recieved_song_infos = []
+    durations = []
+    for result in results:
+        recieved_song_title:str = result.get("name", "")
+        recieved_song_album:str = result.get("album", {}).get("name", "")
+        recieved_song_artist:str = " ".join(artist.get("name", "") for artist in result.get("artists", {}).get("all", []))
+        recieved_song_infos.append(f"{recieved_song_title} {recieved_song_album} {recieved_song_artist}")
+        try: durations.append(float(result.get("duration")))
+        except (TypeError, ValueError): durations.append(None)
+
+    index = best_match(song, recieved_song_infos, threshold=60, durations=durations)
+    return results[index] if index is not None else None
+
+def fetch_lyrics(song:SongMetadata)->tuple:
+    result = None
+    if worth_album_lookup(song):
+        # album lookup, shared by every song of the album
+        album_songs = _albums.get(album_key(song), partial(_album_songs, song))
+        if album_songs: result = _best_result(song, album_songs)
+
+    if result is None:
+        # song search
+        data = _get_data(f"{SEARCH_URL}/songs", params={"query": song.query})
+        if data is None: return (False, False)
+        results:list = data.get("results", [])[:10] # top 10 hits
+        result = _best_result(song, results)
+        if result is None: return (False, False)
 
     lyrics_id = result.get("id", "")
     lyrics_url = f"https://www.jiosaavn.com/api.php?__call=lyrics.getLyrics&lyrics_id={lyrics_id}&ctx=web6dot0&api_version=4&_format=json&_marker=0"
 
     # lyrics fetch
-    response = requests.get(lyrics_url, timeout=30)
+    response = transport.get(lyrics_url, provider="JioSaavn", stage="lyrics_fetch", timeout=30)
     json_data = response.json()
 
     # with open("jiosaavn_response.json", "w", encoding="utf-8") as f:
@@ -54,20 +87,18 @@ def fetch_lyrics(song_path:str)->tuple:
 
     unsynced_lyrics:str = json_data.get("lyrics", "")
     if len(unsynced_lyrics)<1: return (False, False)
-    unsynced_lyrics = unsynced_lyrics.replace("<br>", "\n")
-    unsynced_lyrics += "\nSource: JioSaavn"
-    return (False, unsynced_lyrics)
+    return (False, Lyrics.from_text(unsynced_lyrics.replace("<br>", "\n"), source="JioSaavn"))
 
 if __name__ == "__main__":
     MUSIC_DIRECTORY = "C:\\Users\\Max\\Desktop\\music\\small"
-    music_files = get_songs(music_dir=MUSIC_DIRECTORY)
+    music_files = walk_audio_files(roots=[MUSIC_DIRECTORY])
     # music_files = ["C:\\Users\\Max\\Desktop\\music\\small\\Sunidhi Chauhan - Tum Mile.flac"]
 
     for i, song_path in enumerate(music_files):
         # from pathlib import Path
         # song_path = Path(song_path)
         print(f"{i+1}. {song_path.stem}")
-        _, unsynced =  fetch_lyrics(song_path=song_path)
+        _, unsynced =  fetch_lyrics(song=read_song_metadata(song_path))
         if unsynced is False: print(f"unsynced: False")
 
         underline = "‾" * len(song_path.stem)
@@ -1,9 +1,9 @@
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import requests
 import random
-from utils.helpers import human_delay, extract_lrclib_lyrics, build_search_query, match_song_metadata, get_songs
-import time
+from utils.scanner import walk_audio_files
+from utils.helpers import read_song_metadata, SongMetadata
+from utils.matching import best_match
+from utils.lyrics import Lyrics
+from utils.transport import transport
 import logging
 import json
 
@@ -24,129 +24,124 @@ UA_POOL = [
 BASE_HEADERS = {
     "Accept": "application/json, text/plain, */*",
     "Accept-Language": "en-US,en;q=0.9",
-    # kill keep-alive to avoid poisoned TLS sockets
-    "Connection": "close",
 }
-_retry = Retry(
-    total=0,
-    backoff_factor=1.5,
-    status_forcelist=[500, 502, 503, 504],
-    allowed_methods=["GET"],
-    raise_on_status=False,
-)
-
-_adapter = HTTPAdapter(max_retries=_retry)
-
-# Session factory
-def new_session() -> requests.Session:
-    s = requests.Session()
-    s.mount("https://", _adapter)
-    headers = BASE_HEADERS.copy()
-    headers["User-Agent"] = random.choice(UA_POOL)
-    s.headers.update(headers)
-    return s
-
-# Global session (rotated)
-_session = new_session()
-_request_count = 0
-SESSION_ROTATE_EVERY = 7
-
-def fetch_lyrics(song_path: str) -> tuple:
+# keep-alive connections come from the shared transport, broken ones are replaced there
+HEADERS = {**BASE_HEADERS, "User-Agent": random.choice(UA_POOL)}
+
+def fetch_lyrics(song: SongMetadata) -> tuple:
     """
     Fetch lyrics from lrclib
     
-    :param song_path: song path
-    :type song_path: str
-    :return: (synced_lyrics, unsynced_lyrics) items can be str|False
+    :param song: song metadata
+    :type song: SongMetadata
+    :return: (synced_lyrics, unsynced_lyrics) items can be Lyrics|False
     :rtype: tuple
+    :raises requests.RequestException: if lrclib can't be reached or fails, so the miss isn't cached
 
     """
-    global _session, _request_count
-
-    cache = {
-        "synced_lyrics":False,
-        "synced_description":False,
-        "unsynced_lyrics":False,
-        "unsynced_description":False
-    }
-
-    # rotate session periodically
-    _request_count += 1
-    if _request_count % SESSION_ROTATE_EVERY == 0:
-        try:
-            _session.close()
-        finally:
-            _session = new_session()
-
-    """
-    sleep_duration = human_delay()
-    log.info(f"WAITING - {sleep_duration:0.2f}s before next lrclib request")
-    time.sleep(sleep_duration)
-    """
-
-    search_query = build_search_query(song_path=song_path)
-
-    try:
-        response = _session.get(
-            "https://lrclib.net/api/search",
-            params={
-                "q": search_query,
-                "limit": random.choice([10, 15, 20]),
-            },
-            timeout=(3, 10),
-            allow_redirects=True,
-        )
-
-    except requests.exceptions.SSLError:
-        # poisoned TLS session → hard reset
-        try:
-            _session.close()
-        finally:
-            _session = new_session()
-        return (False, False)
-
-    except requests.exceptions.RequestException:
-        return (False, False)
-
-    # explicit rate-limit handling
-    if response.status_code == 429:
-        time.sleep(random.uniform(60, 120))
-        return (False, False)
-
-    if response.status_code != 200:
-        return (False, False)
+    # exact signature lookup first, one small response instead of a page of search results
+    signature_hit = _fetch_signature(song)
+    if signature_hit is not None and signature_hit[0]:
+        return signature_hit
+    # a signature hit with plain lyrics only, another upload of the song may be synced.
+    # searched whatever the fetch mode, the result is cached for runs of every mode
+
+    search_query = song.query
+
+    # rate-limit handling: raises RateLimited on 429 so the song gets requeued
+    # connection errors and 5xx are raised by the transport
+    response = transport.get(
+        "https://lrclib.net/api/search",
+        provider="Lrclib",
+        stage="search",
+        params={
+            "q": search_query,
+            "limit": random.choice([10, 15, 20]),
+        },
+        headers=HEADERS,
+        timeout=(3, 10),
+        allow_redirects=True,
+    )
+
+    signature_unsynced = signature_hit[1] if signature_hit is not None else False
+    if response.status_code != 200:     # searched, nothing usable
+        return (False, signature_unsynced)
 
     try: json_response = response.json()
-    except ValueError: return (False, False)
-    # print(json_response)
+    except ValueError: return (False, signature_unsynced)
+    if not isinstance(json_response, list): return (False, signature_unsynced)
     # with open(f"_lyrics/1.json", "w", encoding="utf-8") as f:
     #     json.dump(json_response, f, ensure_ascii=False, indent=2)
-    
-    lyrics = extract_lrclib_lyrics(json_data=json_response)  # tuple is returned
-    # print(lyrics)
-
-    cache["synced_lyrics"], cache["synced_description"], cache["unsynced_lyrics"], cache["unsynced_description"] = lyrics
 
-    try:
-        sync_flag = match_song_metadata(print_match=False, threshold=60, local_song_path=song_path, received_song_info=cache["synced_description"])
-        unsync_flag = match_song_metadata(print_match=False, threshold=60, local_song_path=song_path, received_song_info=cache["unsynced_description"])
-        if sync_flag is False: cache["synced_lyrics"] = False
-        if unsync_flag is False: cache["unsynced_lyrics"] = False
-    except:
-        # log.info("FAILURE - LrcLib sync_flag: incorrect match")
-        # log.info("FAILURE - LrcLib unsync_flag: incorrect match")
-        pass
+    synced = _best_lyrics(song, json_response, key="syncedLyrics")
+    unsynced = signature_unsynced or _best_lyrics(song, json_response, key="plainLyrics")
+    return (synced, unsynced)
 
-    return (cache["synced_lyrics"], cache["unsynced_lyrics"])
+def _fetch_signature(song: SongMetadata) -> tuple|None:
+    """
+    look a song up by its exact signature: track, artist, album and duration
+
+    :param song: song metadata
+    :type song: SongMetadata
+    :return: (synced_lyrics, unsynced_lyrics) items can be Lyrics|False, None on a miss
+    :rtype: tuple | None
+    :raises RateLimited: if lrclib throttles the request
+    :raises requests.RequestException: if lrclib can't be reached or fails
+    """
+    title, artist, album, _ = song.raw_tags
+    if not (title and artist and album and song.duration > 0): return None    # signature is incomplete
+
+    response = transport.get(
+        "https://lrclib.net/api/get",
+        provider="Lrclib",
+        stage="signature",
+        params={
+            "track_name": title,
+            "artist_name": artist,
+            "album_name": album,
+            "duration": round(song.duration),   # lrclib allows ±2s
+        },
+        headers=HEADERS,
+        timeout=(3, 10),
+    )
+    if response.status_code != 200: return None     # 404 = no track with this signature
+
+    try: item = response.json()
+    except ValueError: return None
+    if not isinstance(item, dict): return None
+    synced = item.get("syncedLyrics")
+    unsynced = item.get("plainLyrics")
+    return (Lyrics.from_lrc(synced, source="Lrclib") if synced else False,
+            Lyrics.from_text(unsynced, source="Lrclib") if unsynced else False)
+
+def _best_lyrics(song: SongMetadata, items: list[dict], key: str) -> Lyrics|bool:
+    """lyrics of the best matching search result that has them
+
+    :param song: song metadata
+    :type song: SongMetadata
+    :param items: lrclib search results
+    :type items: list[dict]
+    :param key: "syncedLyrics" or "plainLyrics"
+    :type key: str
+    :return: lyrics, False if no result matches
+    :rtype: Lyrics | bool
+    """
+    items = [item for item in items if item.get(key) is not None]
+    infos = [f'{item.get("trackName", "")} {item.get("artistName", "")} {item.get("albumName", "")}' for item in items]
+    durations = [item.get("duration") for item in items]
+    index = best_match(song, infos, threshold=60, durations=durations)
+    if index is None: return False
+    if key == "syncedLyrics": return Lyrics.from_lrc(items[index][key], source="Lrclib")
+    return Lyrics.from_text(items[index][key], source="Lrclib")
 
 
 if __name__ == "__main__":
     MUSIC_DIRECTORY = "C:\\Users\\Max\\Desktop\\music\\small"
-    music_files = get_songs(music_dir=MUSIC_DIRECTORY)
+    music_files = walk_audio_files(roots=[MUSIC_DIRECTORY])
 
     for i, song_path in enumerate(music_files):
         print(f"{i+1}. {song_path.stem}")
-        synced, unsynced =  fetch_lyrics(song_path=song_path)
+        synced, unsynced =  fetch_lyrics(song=read_song_metadata(song_path))
         if synced is False: print(f"synced: False")
         if unsynced is False: print(f"unsynced: False")
         underline = "‾" * len(song_path.stem)
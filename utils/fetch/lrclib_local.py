@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import time
+import logging
+from utils.scanner import walk_audio_files
+from utils.helpers import read_song_metadata, SongMetadata
+from utils.matching import best_match
+from utils.lyrics import Lyrics
+from config import LRCLIB_DB_FILE, LRCLIB_INDEX_FILE
+
+log = logging.getLogger(__name__)
+
+# lrclib database dump schema: tracks.last_lyrics_id -> lyrics.id
+# tracks_fts lives in the index file (tools/lrclib_index.py), rowid = tracks.id
+CANDIDATES_QUERY = """
+SELECT tracks.name, tracks.artist_name, tracks.album_name, tracks.duration, lyrics.synced_lyrics, lyrics.plain_lyrics
+FROM tracks_fts
+JOIN dump.tracks ON tracks.id = tracks_fts.rowid
+JOIN dump.lyrics ON lyrics.id = tracks.last_lyrics_id
+WHERE tracks_fts MATCH ?
+ORDER BY rank
+LIMIT ?
+"""
+CANDIDATE_LIMIT = 50
+MIN_TERM_LENGTH = 3     # the trigram tokenizer can't look up shorter terms
+
+_local = threading.local()  # one read connection per song worker
+
+
+def _get_conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{LRCLIB_INDEX_FILE}?mode=ro", uri=True)
+        conn.execute("ATTACH DATABASE ? AS dump", (f"file:{LRCLIB_DB_FILE}?mode=ro",))
+        _local.conn = conn
+    return conn
+
+def _terms(text: str) -> list[str]:
+    """fts5 phrases of the words long enough for the trigram tokenizer"""
+    return ['"' + word.replace('"', '""') + '"' for word in text.split() if len(word) >= MIN_TERM_LENGTH]
+
+def _match_queries(song: SongMetadata) -> list[str]:
+    """fts5 queries, narrowest first: tracks whose name has every word of the title
+    and whose artist has one of the artist's words, then the title alone
+    """
+    title_terms = _terms(song.title)
+    if not title_terms: return []
+    name_query = "name : (" + " AND ".join(title_terms) + ")"
+    artist_terms = _terms(song.artist)
+    if not artist_terms: return [name_query]
+    # a common title alone can fill the candidate limit with other artists' songs
+    return [f"{name_query} AND artist_name : (" + " OR ".join(artist_terms) + ")", name_query]
+
+def fetch_lyrics(song: SongMetadata) -> tuple:
+    """
+    Fetch lyrics from a local lrclib database
+
+    :param song: song metadata
+    :type song: SongMetadata
+    :return: (synced_lyrics, unsynced_lyrics) items can be Lyrics|False
+    :rtype: tuple
+    """
+    for query in _match_queries(song):
+        try: rows = _get_conn().execute(CANDIDATES_QUERY, (query, CANDIDATE_LIMIT)).fetchall()
+        except sqlite3.Error as e:
+            log.warning(f"FAILURE - Lrclib local lookup: {e}")
+            return (False, False)
+        synced, unsynced = _best_lyrics(song, rows, column=4), _best_lyrics(song, rows, column=5)
+        if synced or unsynced: return (synced, unsynced)
+    return (False, False)
+
+def _best_lyrics(song: SongMetadata, rows: list[tuple], column: int) -> Lyrics|bool:
+    """lyrics of the best matching row that has them, column 4 is synced and 5 plain lyrics"""
+    rows = [row for row in rows if row[column]]
+    infos = [f"{name} {artist_name} {album_name}" for name, artist_name, album_name, *_ in rows]
+    durations = [row[3] for row in rows]
+    index = best_match(song, infos, threshold=60, durations=durations)
+    if index is None: return False
+    if column == 4: return Lyrics.from_lrc(rows[index][column], source="Lrclib")
+    return Lyrics.from_text(rows[index][column], source="Lrclib")
+
+
+if __name__ == "__main__":
+    MUSIC_DIRECTORY = "C:\\Users\\Max\\Desktop\\music\\small"
+    music_files = walk_audio_files(roots=[MUSIC_DIRECTORY])
+
+    for i, song_path in enumerate(music_files):
+        start = time.perf_counter()
+        synced, unsynced = fetch_lyrics(song=read_song_metadata(song_path))
+        print(f"{i+1}. {song_path.stem} | synced: {synced is not False} | unsynced: {unsynced is not False} | {(time.perf_counter() - start) * 1000:0.1f}ms")
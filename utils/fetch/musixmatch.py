@@ -1,89 +1,307 @@
-from utils.helpers import extract_spotify_lyrics, build_search_query, match_song_metadata, get_songs, clear_profile_cache
+from utils.scanner import walk_audio_files
+from utils.helpers import extract_spotify_lyrics, clear_profile_cache, read_song_metadata, SongMetadata
 import logging
-from bs4 import BeautifulSoup
-from config import SPOTIFY_TRACK_CSS_SELECTOR
+from config import SPOTIFY_SEARCH_RESPONSE_URL, SPOTIFY_SEARCH_OPERATION, SPOTIFY_RESOLVE_MODE, BROWSER_PAGE_POOL_SIZE, BROWSER_PAGE_MAX_USES, BROWSER_BLOCKED_RESOURCES
 import requests
-from utils.playwright_driver import PlaywrightDriver
 import re
 import json
-import time
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, Future
 from utils.spotify_auth import SpotifyAuthManager
+from utils.transport import transport
+from utils.metrics import metrics, HIT, MISS
+from utils.matching import best_match, best_album_match
+from utils.albums import AlbumCache, album_key, album_query, worth_album_lookup
+from functools import partial
+from typing import Iterator, TYPE_CHECKING
 
-total_wasted_time = {"total_wasted_time": 0}
+if TYPE_CHECKING:
+    from utils.playwright_driver import PlaywrightDriver
 
 log = logging.getLogger(__name__)
 
-auth = SpotifyAuthManager()
-driver = PlaywrightDriver(headless=True)  # False for debugging
+SPOTIFY_SEARCH_API_URL = "https://api.spotify.com/v1/search"
+SPOTIFY_ALBUM_API_URL = "https://api.spotify.com/v1/albums"
 
-def fetch_lyrics(song_path: str) -> tuple:
+# album track lists, one album lookup serves every song of the album
+_albums = AlbumCache("MusixMatch")
+
+auth = None
+_auth_lock = threading.Lock()
+
+def _get_auth() -> SpotifyAuthManager:
+    """create the spotify auth manager on first use, it fetches the totp secret"""
+    global auth
+    with _auth_lock:
+        if auth is None:
+            auth = SpotifyAuthManager()
+    return auth
+
+# playwright's sync api is bound to the thread that started it, so the driver
+# lives on its own thread and every browser call is handed over to it.
+# the browser is only started the first time it is needed.
+_browser_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playwright")
+_pending_searches = queue.Queue()   # (search_url, Future) waiting for a page, the future gets the search response json
+driver = None
+
+def _get_driver() -> "PlaywrightDriver":
+    """start the browser on first use (runs on browser thread)"""
+    global driver
+    if driver is None:
+        from utils.playwright_driver import PlaywrightDriver    # playwright is only needed for browser lookups
+        driver = PlaywrightDriver(headless=True, pool_size=BROWSER_PAGE_POOL_SIZE, max_page_uses=BROWSER_PAGE_MAX_USES, blocked_resources=BROWSER_BLOCKED_RESOURCES)  # False for debugging
+    return driver
+
+def _is_search_response(response) -> bool:
+    """True for the graphql response carrying the search page's results"""
+    if SPOTIFY_SEARCH_RESPONSE_URL not in response.url: return False
+    operation = f'operationName={SPOTIFY_SEARCH_OPERATION}'     # GET, in the query string
+    if operation in response.url: return True
+    post_data = response.request.post_data or ""    # POST, in the json body
+    return f'"operationName":"{SPOTIFY_SEARCH_OPERATION}' in post_data.replace(" ", "")
+
+def _drain_pending_searches():
+    """resolve a batch of waiting searches on the page pool (runs on browser thread)
+
+    all navigations of a batch are started first and finished afterwards, so
+    the searches load side by side in one chromium process. the results are
+    taken from the search page's own graphql response, without waiting for
+    the page to render.
     """
-    Fetch lyrics from musixmatch-via-spotify
-    
-    :param song_path: song path
-    :type song_path: str
-    :return: (synced_lyrics, unsynced_lyrics) items can be str|False
-    :rtype: tuple
+    batch = []
+    while len(batch) < BROWSER_PAGE_POOL_SIZE:
+        try: batch.append(_pending_searches.get_nowait())
+        except queue.Empty: break
+    if not batch: return
+
+    try: browser = _get_driver()
+    except Exception as e:
+        for _, future in batch: future.set_exception(e)
+        return
+
+    started = []
+    captured = {}   # page -> search response, caught while the other pages of the batch load
+    for search_url, future in batch:
+        try: page = browser.checkout()
+        except Exception as e:
+            future.set_exception(e)
+            continue
+        def on_response(response, page=page):
+            if page not in captured and _is_search_response(response): captured[page] = response
+        page.on("response", on_response)
+        try:
+            page.goto(search_url, wait_until="commit")
+            started.append((page, future, on_response))
+        except Exception as e:
+            page.remove_listener("response", on_response)
+            browser.checkin(page, failed=True)
+            future.set_exception(e)
+
+    for page, future, on_response in started:
+        try:
+            response = captured.get(page) or page.wait_for_event("response", predicate=_is_search_response)
+            future.set_result(response.json())
+            page.remove_listener("response", on_response)
+            browser.checkin(page)
+        except Exception as e:
+            page.remove_listener("response", on_response)
+            browser.checkin(page, failed=True)
+            future.set_exception(e)
+
+def _browser_search(search_url: str) -> dict:
+    """open spotify search page on a pooled page and return its search response
 
+    :param search_url: spotify search page url
+    :type search_url: str
+    :return: graphql search response json
+    :rtype: dict
     """
-    cache = {
-        "synced_lyrics":False,
-        "unsynced_lyrics":False
+    future = Future()
+    _pending_searches.put((search_url, future))
+    _browser_thread.submit(_drain_pending_searches)  # no-op if an earlier batch already took it
+    return future.result()
+
+def close_driver():
+    """close the browser (if it was started) on its own thread and stop that thread"""
+    if driver is not None:
+        _browser_thread.submit(driver.close).result()
+    _browser_thread.shutdown()
+
+def _spotify_api_get(url: str, params: dict|None = None) -> dict:
+    """authenticated spotify web api GET
+
+    :raises requests.RequestException: if the request fails
+    """
+    headers = {
+        "Authorization": f"Bearer {_get_auth().get_token()}",
+        "App-Platform": "WebPlayer",
     }
+    response = transport.get(url, provider="MusixMatch", stage="search", params=params, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def _cover_img_id(album: dict) -> str|None:
+    """encoded cover image id of a spotify album, color-lyrics needs it"""
+    images = album.get("images", [])
+    match = re.search(r"/image/([A-Za-z0-9]+)", images[0].get("url", "")) if images else None
+    return match.group(1) if match else None
+
+def _pick_track(song: SongMetadata, tracks: list[dict], album: dict|None = None) -> tuple|bool:
+    """best matching track of a search or an album track list
+
+    :param song: song metadata
+    :type song: SongMetadata
+    :param tracks: spotify track objects
+    :type tracks: list[dict]
+    :param album: album of every track, for album track lists whose tracks don't carry it
+    :type album: dict | None
+    :return: (track_id, encoded_img_id) of the best matching candidate, False if none matches
+    :rtype: tuple | bool
+    """
+    candidates = []     # (track_id, encoded_img_id)
+    recieved_song_infos = []
+    durations = []
+    for track in tracks:
+        track_album = album or track.get("album", {})
+        img_id = _cover_img_id(track_album)
+        if img_id is None: continue
+        artists = " ".join(artist.get("name", "") for artist in track.get("artists", []))
+        candidates.append((track["id"], img_id))
+        recieved_song_infos.append(f'{track.get("name", "")} {artists} {track_album.get("name", "")}')
+        durations.append(track["duration_ms"] / 1000 if track.get("duration_ms") else None)
 
-    search_query = build_search_query(song_path=song_path)
+    index = best_match(song, recieved_song_infos, threshold=70, durations=durations)
+    if index is None: return False
+    return candidates[index]
+
+def _resolve_album(song: SongMetadata) -> tuple|None:
+    """(album, tracks) of the album of song, with one album search and one track list request"""
+    params = {"q": album_query(song), "type": "album", "limit": 5, "market": "from_token"}
+    albums = _spotify_api_get(SPOTIFY_SEARCH_API_URL, params).get("albums", {}).get("items", [])
+    recieved_album_infos = [
+        f'{album.get("name", "")} {" ".join(artist.get("name", "") for artist in album.get("artists", []))}'
+        for album in albums
+    ]
+    index = best_album_match(song, recieved_album_infos, threshold=70)
+    if index is None: return None
+    album = albums[index]
+    tracks = _spotify_api_get(f"{SPOTIFY_ALBUM_API_URL}/{album['id']}/tracks", {"limit": 50, "market": "from_token"})
+    return (album, tracks.get("items", []))
+
+def _resolve_via_api(song: SongMetadata) -> tuple|bool:
+    """find the spotify track of a song with the authenticated search api, no browser involved
+
+    songs of an album that is in the run several times are looked up in the
+    album's track list, resolved once for all of them.
+
+    :param song: song metadata
+    :type song: SongMetadata
+    :return: (track_id, encoded_img_id) of the best matching candidate, False if none matches
+    :rtype: tuple | bool
+    :raises requests.RequestException: if the search request fails
+    """
+    if worth_album_lookup(song):
+        album = _albums.get(album_key(song), partial(_resolve_album, song))
+        if album is not None:
+            resolved = _pick_track(song, tracks=album[1], album=album[0])
+            if resolved is not False: return resolved
+
+    params = {"q": song.query, "type": "track", "limit": 10, "market": "from_token"}
+    tracks = _spotify_api_get(SPOTIFY_SEARCH_API_URL, params).get("tracks", {}).get("items", [])
+    return _pick_track(song, tracks)
+
+def _resolve_via_browser(song: SongMetadata) -> tuple|bool:
+    """find the spotify track of a song through the search page in playwright
+
+    every track of the intercepted search response is scored, not just the first one.
+
+    :param song: song metadata
+    :type song: SongMetadata
+    :return: (track_id, encoded_img_id) if matched, otherwise False
+    :rtype: tuple | bool
+    """
+    search_query = song.query
     # print(f"______Search Query: {search_query}")
     search_url = f"https://open.spotify.com/search/{search_query}/tracks"
     # print(f"Spotify search url: {search_url}")
 
-    # ---------------------------------------
-    wasted_time_start = time.time()
-    # ---------------------------------------
+    with metrics.span("browser_search"):
+        search_response = _browser_search(search_url)
+    return _pick_track(song, list(_graphql_tracks(search_response)))
 
-    driver.page.goto(search_url)
-    driver.page.wait_for_selector(SPOTIFY_TRACK_CSS_SELECTOR)
-    driver.page.click(SPOTIFY_TRACK_CSS_SELECTOR)
-    driver.page.wait_for_url("**/track/**")
+def _graphql_tracks(node) -> Iterator[dict]:
+    """tracks of a graphql search response, shaped like web api track objects for _pick_track
 
-    spotify_track_url = driver.page.url
-    # print(f"Spotify _track url: {spotify_track_url}")
+    the response is walked for Track nodes instead of following a fixed path,
+    which changes between search operations (searchDesktop, searchTracks, ...).
+    """
+    seen = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))    # keep the search order
+            continue
+        if not isinstance(node, dict): continue
+        uri = node.get("uri", "")
+        if node.get("__typename") == "Track" and isinstance(uri, str) and uri.startswith("spotify:track:"):
+            track_id = uri.rsplit(":", 1)[-1]
+            if track_id in seen: continue
+            seen.add(track_id)
+            album = node.get("albumOfTrack") or {}
+            yield {
+                "id": track_id,
+                "name": node.get("name", ""),
+                "duration_ms": (node.get("duration") or {}).get("totalMilliseconds"),
+                "artists": [{"name": (artist.get("profile") or {}).get("name", "")} for artist in (node.get("artists") or {}).get("items", [])],
+                "album": {
+                    "name": album.get("name", ""),
+                    "images": [{"url": source.get("url", "")} for source in (album.get("coverArt") or {}).get("sources", [])],
+                },
+            }
+            continue
+        stack.extend(reversed(list(node.values())))
 
-    #/start For track comparison 
-    resp = requests.get(spotify_track_url,headers={"User-Agent": "Mozilla/5.0"},timeout=10)
-    if resp.status_code != 200: return (False, False)  
+def _resolve_track(song: SongMetadata) -> tuple|bool:
+    """resolve spotify track id and cover image id of a song, per SPOTIFY_RESOLVE_MODE"""
+    match SPOTIFY_RESOLVE_MODE:
+        case 0: # api only
+            return _resolve_via_api(song)
+        case 1: # browser only
+            return _resolve_via_browser(song)
+        case _: # Default: api with browser fallback
+            try:
+                return _resolve_via_api(song)
+            except requests.RequestException as e:
+                log.warning(f"FALLBACK - Spotify search api failed ({e}), using browser")
+                return _resolve_via_browser(song)
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-    def meta(prop):
-        tag = soup.find("meta", property=prop)
-        return tag["content"] if tag else None
-    
-    try:
-        encoded_img_url = meta("og:image")
-        # print(f"Encoded image url: {encoded_img_url}")
-        match = re.search(r"/image/([A-Za-z0-9]+)", encoded_img_url)
-        encoded_img_id = match.group(1)
-        # print(f"Encoded image id: {encoded_img_id}")
-    except: return (False, False)
+def fetch_lyrics(song: SongMetadata) -> tuple:
+    """
+    Fetch lyrics from musixmatch-via-spotify
 
-    recieved_song_title = meta("og:title")
-    recieved_song_description = meta("og:description")
-    recieved_song_info = f'{recieved_song_title} {recieved_song_description}'
-    flag = match_song_metadata(local_song_path=song_path, received_song_info=recieved_song_info, threshold=70)
-    if flag is False: return (False, False)
-    #/end For track comparison
+    :param song: song metadata
+    :type song: SongMetadata
+    :return: (synced_lyrics, unsynced_lyrics) items can be Lyrics|False
+    :rtype: tuple
 
-    match = re.search(r"/track/([A-Za-z0-9]+)", spotify_track_url)
-    spotify_track_id = match.group(1)
-    # print(f"Spotify track id: {spotify_track_id}")
+    """
+    cache = {
+        "synced_lyrics":False,
+        "unsynced_lyrics":False
+    }
 
-    # ---------------------------------------
-    elapsed_wasted_time = time.time() - wasted_time_start
-    total_wasted_time["total_wasted_time"] += elapsed_wasted_time
-    # ---------------------------------------
+    # track id resolution, the slow part (search api or browser)
+    with metrics.span("resolve") as span:
+        resolved = _resolve_track(song)
+        span.outcome = HIT if resolved is not False else MISS
+    if resolved is False: return (False, False)
+    spotify_track_id, encoded_img_id = resolved
 
     lyrics_url = f"https://spclient.wg.spotify.com/color-lyrics/v2/track/{spotify_track_id}/image/https%3A%2F%2Fi.scdn.co%2Fimage%2F{encoded_img_id}?format=json&vocalRemoval=false&market=from_token"
-    
-    spotify_auth_token = auth.get_token()
+
+    spotify_auth_token = _get_auth().get_token()
     spotify_auth = f"Bearer {spotify_auth_token}"
     headers = {
         "Authorization": spotify_auth,
@@ -91,35 +309,36 @@ def fetch_lyrics(song_path: str) -> tuple:
         "User-Agent": "Spotify/1.2.0",
     }
 
+    # connection errors and 5xx are raised by the transport, so an outage isn't cached as a miss
+    response = transport.get(lyrics_url, provider="MusixMatch", stage="lyrics_fetch", headers=headers)
+    if response.status_code == 404: return (False, False)  # track has no lyrics
+    response.raise_for_status()
     try:
-        response = requests.get(url=lyrics_url, headers=headers)
         json_data = response.json()
-        # with open(f"lyrics/{recieved_song_title}.json", "w", encoding="utf-8") as f:
+        # with open(f"lyrics/{spotify_track_id}.json", "w", encoding="utf-8") as f:
         #     json.dump(json_data, f, ensure_ascii=False, indent=2)
     except: return (False, False)
 
     lyrics = extract_spotify_lyrics(json_data=json_data)
-    try: 
+    try:
         cache["synced_lyrics"] = lyrics[0]
         cache["unsynced_lyrics"] = lyrics[1]
     except: pass
-        
+
 
     return (cache["synced_lyrics"], cache["unsynced_lyrics"])
 
 
 if __name__ == "__main__":
     MUSIC_DIRECTORY = "C:\\Users\\Max\\Desktop\\music\\small"
-    music_files = get_songs(music_dir=MUSIC_DIRECTORY)
+    music_files = walk_audio_files(roots=[MUSIC_DIRECTORY])
 
     for i, song_path in enumerate(music_files):
         print(f"{i+1}. {song_path.stem}")
-        synced, unsynced =  fetch_lyrics(song_path=song_path)
+        synced, unsynced =  fetch_lyrics(song=read_song_metadata(song_path))
         if synced is False: print(f"synced: False")
         if unsynced is False: print(f"unsynced: False")
         underline = "‾" * len(song_path.stem)
         with open(f"lyrics/{song_path.stem}.lrc", "w", encoding="utf-8") as f:
             f.write(f"{song_path.stem}\n{underline}\n{synced}")
             f.write(f"\n\n{song_path.stem}\n{underline}\n{unsynced}")
-
-
@@ -0,0 +1,102 @@
+import importlib
+import config
+import os
+from pathlib import Path
+import threading
+import time
+import logging
+from types import ModuleType
+from dotenv import load_dotenv
+
+log = logging.getLogger(__name__)
+
+load_dotenv()
+
+class Provider:
+    """a lyrics source that is imported and set up the first time it is used
+
+    importing a provider module may start a browser or hit the network, so
+    nothing happens until the first lookup. a provider whose required
+    environment variables, config settings or files are missing is not
+    configured and gets skipped.
+    """
+    def __init__(self, name: str, module_path: str, required_env: tuple = (), required_config: tuple = (),
+                 required_files: dict|None = None, close_hook: str|None = None):
+        self.name = name
+        self.module_path = module_path
+        self.required_env = required_env
+        self.required_config = required_config  # config.py settings that must be set
+        self.required_files = required_files or {}  # config.py setting of a file that must exist -> how to create it
+        self.close_hook = close_hook    # module function to call on shutdown
+        self.module: ModuleType|None = None
+        self.init_time_s: float|None = None
+        self._lock = threading.Lock()
+
+    @property
+    def missing_env(self) -> list[str]:
+        return [key for key in self.required_env if not os.getenv(key)]
+
+    @property
+    def missing_config(self) -> list[str]:
+        return [key for key in self.required_config if not getattr(config, key, None)]
+
+    @property
+    def missing_files(self) -> list[str]:
+        return [key for key in self.required_files if not getattr(config, key, None) or not Path(getattr(config, key)).exists()]
+
+    @property
+    def configured(self) -> bool:
+        return not self.missing_env and not self.missing_config and not self.missing_files
+
+    def load(self) -> ModuleType:
+        """import and set up the provider module once, thread safe"""
+        if self.module is not None: return self.module
+        with self._lock:
+            if self.module is None:
+                start = time.time()
+                module = importlib.import_module(self.module_path)
+                self.init_time_s = time.time() - start
+                self.module = module
+                log.info(f"==== {self.name} provider was initialized in {self.init_time_s:0.2f}s ====")
+        return self.module
+
+    def __call__(self, song) -> tuple:
+        return self.load().fetch_lyrics(song=song)
+
+    def close(self):
+        if self.module is not None and self.close_hook:
+            getattr(self.module, self.close_hook)()
+
+
+# priority order
+PROVIDERS = {
+    "MusixMatch": Provider("MusixMatch", "utils.fetch.musixmatch", required_env=("SP_DC_TOKEN",), close_hook="close_driver"),
+    "LrclibLocal": Provider("LrclibLocal", "utils.fetch.lrclib_local", required_config=("LRCLIB_DB_FILE",),
+                            required_files={"LRCLIB_INDEX_FILE": "run python -m tools.lrclib_index"}),
+    "Lrclib": Provider("Lrclib", "utils.fetch.lrclib"),
+    "Genius": Provider("Genius", "utils.fetch.genius", required_env=("GENIUS_ACCESS_TOKEN",)),
+    "JioSaavn": Provider("JioSaavn", "utils.fetch.jiosaavn"),
+}
+
+def configured_providers() -> dict[str, Provider]:
+    """providers that can be used, in priority order"""
+    return {name: provider for name, provider in PROVIDERS.items() if provider.configured}
+
+def startup_report() -> list[str]:
+    """one line per provider, telling whether it is skipped, waiting for first use or initialized"""
+    lines = []
+    for name, provider in PROVIDERS.items():
+        if not provider.configured:
+            missing = [f"{key} missing" for key in provider.missing_env] + [f"{key} not set" for key in provider.missing_config]
+            if not missing: missing = [provider.required_files[key] for key in provider.missing_files]
+            lines.append(f"{name}: skipped ({', '.join(missing)})")
+        elif provider.module is None:
+            lines.append(f"{name}: configured, not initialized yet")
+        else:
+            lines.append(f"{name}: initialized in {provider.init_time_s:0.2f}s")
+    return lines
+
+def close_providers():
+    """run the shutdown hook of every initialized provider"""
+    for provider in PROVIDERS.values():
+        provider.close()
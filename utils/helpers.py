@@ -1,33 +1,30 @@
 import random
-import re
+import hashlib
 from mutagen import File
 import logging
 from rapidfuzz import fuzz
 from pathlib import Path
 import shutil
+from utils.normalize import normalize
+from utils.lyrics import Lyrics
+from utils.metrics import metrics
 
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO, # DEBUG 
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("main.log", encoding='utf-8'),
-        logging.StreamHandler()  # also print to console
-    ]
-)
 log = logging.getLogger(__name__)
-log.info("==== New log session was started ====")
-
-def get_songs(music_dir:str)->list[str]:
-    AUDIO_EXTENSIONS = {".mp3", ".flac", ".wav", ".aac", ".m4a",".ogg", ".opus", ".alac", ".aiff"}
-    # MUSIC_DIRECTORY = "C:\\Users\\Max\\Desktop\\music\\small"
-    music_dir = Path(music_dir)
-    music_files = (
-        f for f in music_dir.iterdir()
-        if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS
+
+SPOTIFY_SOURCE = "MusixMatch via Spotify"
+
+def setup_logging(log_file:str = "main.log"):
+    """log to log_file and console, call once from the entry point"""
+    logging.basicConfig(
+        level=logging.INFO, # DEBUG 
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, encoding='utf-8'),
+            logging.StreamHandler()  # also print to console
+        ]
     )
-    return music_files
+    log.info("==== New log session was started ====")
 
 def format_time(seconds: float) -> str:
     ms = int((seconds % 1) * 1000)
@@ -47,20 +44,65 @@ def clean_string(raw_string:str) -> str:
     :rtype: str
     
     """
-    clean_string = raw_string.lower()                         # to lowercase
-    clean_string = re.sub(r"\s*\([^)]*\)", "", clean_string)  # remove anything inside brackets with themselves
-    clean_string = re.sub(r"[^\w\s÷]", " ", clean_string, flags=re.UNICODE)  # remove punctuation, keep unicode,÷(for other languages)
-    clean_string = clean_string.replace("_", " ") # unicode flag ignores "_"
-    clean_string = re.sub(r"\s*Various Interprets", "", clean_string, flags=re.IGNORECASE)  # remove "Various Interprets"
-    clean_string = re.sub(r"\s*Various Artists", "", clean_string, flags=re.IGNORECASE)  # remove "Various Interprets"
-    clean_string = re.sub(r"\s+", " ", clean_string).strip()  # clean excess whitespace
-    return clean_string
-
-def match_song_metadata(local_song_path:str, received_song_info:str, threshold:float, print_match:bool=False) -> bool:
+    return normalize(raw_string)    # precompiled single pass, memoized (utils/normalize.py)
+
+class SongMetadata:
+    """tags of a single song, read once and shared by every fetcher and the matcher"""
+    __slots__ = ("path", "title", "artist", "album", "albumartist", "duration", "query", "tag_hash", "raw_tags")
+
+    def __init__(self, path:Path, title:str, artist:str, album:str, albumartist:str, duration:float, query:str, tag_hash:str, raw_tags:tuple = ("", "", "", "")):
+        self.path = path                # song path
+        self.title = title              # clean title
+        self.artist = artist            # clean artist
+        self.album = album              # clean album
+        self.albumartist = albumartist  # clean album artist
+        self.duration = duration        # seconds
+        self.query = query              # clean search query
+        self.tag_hash = tag_hash        # hash of raw lookup tags
+        self.raw_tags = raw_tags        # (title, artist, album, albumartist) as tagged, for exact lookups
+
+    def __repr__(self) -> str:
+        return f"SongMetadata({self.path.name!r}, query={self.query!r}, duration={self.duration:0.1f})"
+
+def read_song_metadata(song_path:str) -> SongMetadata:
+    """read audio tags of a song once
+
+    :param song_path: song path
+    :type song_path: str
+    :return: song metadata
+    :rtype: SongMetadata
+    """
+    with metrics.context(song=Path(song_path).name):
+        with metrics.span("tag_read"):
+            audio = File(song_path, easy=True)
+            if audio is None:
+                raise ValueError("Unsupported or corrupted audio file")
+
+            def tag(key:str) -> str:
+                return (audio.get(key) or [""])[0] or ""
+
+            title, artist, album, albumartist = tag("title"), tag("artist"), tag("album"), tag("albumartist")
+            tag_hash = hashlib.sha1("\x1f".join((title, artist, album, albumartist)).encode("utf-8")).hexdigest()
+            duration = audio.info.length if audio.info is not None else 0.0
+
+        with metrics.span("query_build"):
+            return SongMetadata(
+                path=Path(song_path),
+                title=clean_string(title),
+                artist=clean_string(artist),
+                album=clean_string(album),
+                albumartist=clean_string(albumartist),
+                duration=duration,
+                query=build_search_query(title=title, artist=artist, album=album),
+                tag_hash=tag_hash,
+                raw_tags=(title, artist, album, albumartist),
+            )
+
+def match_song_metadata(local_song:SongMetadata, received_song_info:str, threshold:float, print_match:bool=False) -> bool:
     """fuzzy match local and recieved song metadata
 
-    :param local_song_path: local song path
-    :type local_song_path: str
+    :param local_song: local song metadata
+    :type local_song: SongMetadata
     :param received_song_info: recieved song complete description as a string
     :type received_song_info: str
     :param threshold: [0-100]
@@ -68,14 +110,9 @@ def match_song_metadata(local_song_path:str, received_song_info:str, threshold:f
     :return: True if match is good, otherise False
     :rtype: bool
     """
-
-    audio = File(local_song_path, easy=True)
-    if audio is None:
-        raise ValueError("Unsupported or corrupted audio file")
-
-    local_song_title:str = clean_string(audio.get("title", [None])[0])
-    local_song_artist:str = clean_string(audio.get("artist", [None])[0])
-    local_song_album:str = clean_string(audio.get("album", [None])[0])
+    local_song_title:str = local_song.title
+    local_song_artist:str = local_song.artist
+    local_song_album:str = local_song.album
     received_song_info:str = clean_string(received_song_info)
 
     score_title = fuzz.partial_ratio(local_song_title, received_song_info)
@@ -107,24 +144,21 @@ def match_song_metadata(local_song_path:str, received_song_info:str, threshold:f
     global_flag = title_flag and (artist_flag or album_flag)
     return global_flag
 
-def build_search_query(song_path: str) -> str:
+def build_search_query(title: str, artist: str, album: str) -> str:
     """Build a search query string from selected audio tags.
 
-    :param song_path: Path to the audio file.
-    :type song_path: str
-    :param source: musixmatch-via-spotify[0], lrclib[1], genius[2]
-    :type source: int
+    :param title: raw title tag
+    :type title: str
+    :param artist: raw artist tag
+    :type artist: str
+    :param album: raw album tag
+    :type album: str
     :return: Clean search query
     :rtype: str
     """
     # TAGS_PRIORITY_ORDER = ["title", "artist", "albumartist" "album"]
     # set default tags to include
     
-    audio = File(song_path)
-    title:str = audio.tags.get("title", [None])[0]
-    album:str = audio.tags.get("album", [None])[0]
-    artist:str = audio.tags.get("artist", [None])[0]
-    
     if title in album:  # remove redundant title present in album eg. title artist title+album -> title artist album
         album = album.replace(title, "")
     
@@ -139,10 +173,10 @@ def human_delay(mean: float = 5.0, jitter: float = 0.3, minimum: float = 3.0):
     sleep_duration = max(minimum, delay)
     return sleep_duration
 
-def save_lyrics(lyrics:str, out_dir: str, out_filename:str) -> bool:
-    lyrics_file = out_dir + f"\\{out_filename}.lrc"
+def save_lyrics(lyrics:Lyrics, out_dir: str, out_filename:str) -> bool:
+    lyrics_file = Path(out_dir) / f"{out_filename}.lrc"
     with open(lyrics_file, "w", encoding="utf-8") as f:
-        f.write(lyrics)
+        f.write(lyrics.serialize())
     return True
 
 def extract_genius_song_url(json_data: dict) -> str|bool:
@@ -176,7 +210,7 @@ def extract_spotify_lyrics(json_data: dict) -> tuple:
     :param json_data: json response from spotify fetch
     :type json_data: dict
     :return: (synced_lyrics, unsynced_lyrics) tuple. items can be False.
-    :rtype: str | bool
+    :rtype: tuple[Lyrics|bool, Lyrics|bool]
 
     """
     if json_data is None: return (False, False)
@@ -184,107 +218,16 @@ def extract_spotify_lyrics(json_data: dict) -> tuple:
     lyrics = json_data.get("lyrics", {})
     syncType = lyrics.get("syncType", "")
     lines_data = lyrics.get("lines", [])
-    lyrics_data = {
-        "synced_lyrics": False,
-        "unsynced_lyrics": False
-    }
-    
-    def ms_to_timestamp(ms: int) -> str:
-        minutes = ms // 60000
-        seconds = (ms % 60000) / 1000
-        return f"{minutes:02d}:{seconds:05.2f}"
-
-    def synced()-> str|bool:
-        if syncType == "LINE_SYNCED":
-            lyrics_data["synced_lyrics"] = ""
-            for entry in lines_data:
-                words = entry.get("words", "").strip()
-                start_ms = int(entry["startTimeMs"])
-                timestamp = ms_to_timestamp(start_ms)
-                lyrics_data["synced_lyrics"] += f"[{timestamp}]{words}\n"
-            return True
-        return False
-
-    def unsynced()-> str|bool:
-        if syncType in ["UNSYNCED", "LINE_SYNCED"]: # to extract unynced lyrics from synced too..
-            lyrics_data["unsynced_lyrics"] = ""
-            for entry in lines_data:
-                words = entry.get("words", "").strip()
-                lyrics_data["unsynced_lyrics"] += f"{words}\n"
-            return True
-        return False
-        
-    if synced() is True:
-        lyrics_data["synced_lyrics"] += "\nSource: MusixMatch via Spotify"
-    if unsynced() is True:
-        lyrics_data["unsynced_lyrics"] += "\nSource: MusixMatch via Spotify"
+    texts = [entry.get("words", "").strip() for entry in lines_data]
 
-    return (lyrics_data["synced_lyrics"], lyrics_data["unsynced_lyrics"])
+    synced_lyrics = False
+    unsynced_lyrics = False
+    if syncType == "LINE_SYNCED":
+        synced_lyrics = Lyrics(texts, source=SPOTIFY_SOURCE, start_ms=[int(entry["startTimeMs"]) for entry in lines_data])
+    if syncType in ["UNSYNCED", "LINE_SYNCED"]: # to extract unynced lyrics from synced too..
+        unsynced_lyrics = Lyrics(texts, source=SPOTIFY_SOURCE)
 
-def extract_lrclib_lyrics(json_data: list[dict]) -> tuple:
-    """
-    extract lyrics and description from json data
-    
-    :param json_data: Description
-    :type json_data: list[dict]
-    :param mode: synced[0], unsynced[1], synced_with_fallback[2]
-    :type mode: int
-    :return: (synced_lyrics, synced_description, unsynced_lyrics, unsynced_description) tuple.
-    :rtype: tuple
-    
-    """
-    if not isinstance(json_data, list): return False
-    
-    def get_description(item:dict)->str:
-        title = clean_string(item.get("trackName", ""))
-        artist = clean_string(item.get("artistName", ""))
-        album = clean_string(item.get("albumName", ""))
-        return f"{title} {artist} {album}" # description
-
-    def get_synced() -> str|bool:
-        """
-        get synced lyrics from lrclib
-        
-        :param json_data: lrclib json data
-        :type json_data: list[dict]
-        :return: (unsynced_lyrics, unsynced_description) items can be False
-        :rtype: tuple
-
-        """
-        synced_lyrics:str = ""
-        synced_description:str|bool = False
-        for item in json_data:
-            synced = item.get("syncedLyrics")    # can be str|None
-            if  synced is not None:
-                synced_lyrics = synced  + "\n\nSource: Lrclib"
-                synced_description = get_description(item=item)
-                return synced_lyrics, synced_description
-        return (False, False)
-
-    def get_unsynced() -> str|bool:
-        """
-        get unsynced lyrics from lrclib
-        
-        :param json_data: lrclib json data
-        :type json_data: list[dict]
-        :return: (unsynced_lyrics, unsynced_description) items can be False
-        :rtype: tuple
-        
-        """
-        unsynced_lyrics:str = ""
-        unsynced_description:str|bool = False
-        for item in json_data:
-            unsynced = item.get("plainLyrics")   # can be str|None
-            if  unsynced is not None:
-                unsynced_lyrics = unsynced  + "\n\nSource: Lrclib"
-                unsynced_description = get_description(item=item)
-                return unsynced_lyrics, unsynced_description
-        return (False, False)
-
-    synced_lyrics, synced_description = get_synced()
-    unsynced_lyrics, unsynced_description = get_unsynced()
-
-    return (synced_lyrics, synced_description, unsynced_lyrics, unsynced_description)
+    return (synced_lyrics, unsynced_lyrics)
 
 def clear_profile_cache():
     PROFILE = Path("playwright_profile")
@@ -311,10 +254,11 @@ def clear_profile_cache():
 
 
 if __name__ == "__main__":
-    # build_search_query(song_path="C:\\Users\\Max\\Desktop\\music\\found\\Aanchal Tyagi - Dhak Dhak.flac")
+    # read_song_metadata(song_path="C:\\Users\\Max\\Desktop\\music\\found\\Aanchal Tyagi - Dhak Dhak.flac").query
 
     received_song_info = 'Tauba Tauba Salim–Sulaiman, Sonu Nigam, Kunal Ganjawala, Sunidhi Chauhan, Richa Sharma · Kaal (Original Motion Picture Soundtrack) · Song · 2005'
-    flag = match_song_metadata(local_song_path="C:\\Users\\Max\\Desktop\\music\\Sonu Nigam - Tauba Tauba.flac", received_song_info=received_song_info, threshold=70)
+    local_song = read_song_metadata(song_path="C:\\Users\\Max\\Desktop\\music\\Sonu Nigam - Tauba Tauba.flac")
+    flag = match_song_metadata(local_song=local_song, received_song_info=received_song_info, threshold=70)
     print(flag)
 
     
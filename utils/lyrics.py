@@ -0,0 +1,158 @@
+import re
+from array import array
+from typing import Iterable, Iterator
+
+SYNCED = "synced"
+UNSYNCED = "unsynced"
+
+# [mm:ss], [mm:ss.xx] or [mm:ss.xxx], one or more at the start of a line, the rest is the text
+LRC_TIME_PATTERN = re.compile(r"\[(\d{1,3}):(\d{2})(?:[.:](\d{1,3}))?\]")
+LRC_TIMES_PATTERN = re.compile(r"^(?:\[\d{1,3}:\d{2}(?:[.:]\d{1,3})?\])+")
+# start time of a line without a timestamp in synced lyrics, eg. [ar:...] tags or blank lines
+UNTIMED = -1
+
+
+def ms_to_timestamp(ms: int, digits: int = 2) -> str:
+    """milliseconds to an lrc mm:ss.xx (digits=2) or mm:ss.xxx (digits=3) timestamp"""
+    unit = 10 ** (3 - digits)
+    fraction = (ms + unit // 2) // unit     # rounded to the precision, carried into seconds/minutes
+    seconds, fraction = divmod(fraction, 10 ** digits)
+    minutes, seconds = divmod(seconds, 60)
+    if digits == 0: return f"{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}.{fraction:0{digits}d}"
+
+def timestamp_to_ms(minutes: str, seconds: str, fraction: str|None) -> int:
+    """lrc timestamp parts to milliseconds, fraction can have 1-3 digits"""
+    fraction_ms = int(fraction.ljust(3, "0")) if fraction else 0
+    return (int(minutes) * 60 + int(seconds)) * 1000 + fraction_ms
+
+class Lyrics:
+    """lyrics of a song as lines of text, with start times for synced lyrics
+
+    start times are kept in an int array next to the texts, so shifting and
+    validation work on integers, and .lrc/plain text is built in one join.
+    lines of synced lyrics without a timestamp are kept with UNTIMED.
+    """
+    __slots__ = ("start_ms", "texts", "source", "sync_type", "digits")
+
+    def __init__(self, texts: Iterable[str], source: str, start_ms: Iterable[int]|None = None, digits: int = 2):
+        """
+        :param texts: line texts
+        :type texts: Iterable[str]
+        :param source: provider label written in the footer, eg. "Lrclib"
+        :type source: str
+        :param start_ms: start time of every line, None for unsynced lyrics
+        :type start_ms: Iterable[int] | None
+        :param digits: fraction digits of the .lrc timestamps, 2 = [mm:ss.xx], 3 = [mm:ss.xxx]
+        :type digits: int
+        """
+        self.texts: list[str] = list(texts)
+        self.source = source
+        self.start_ms = array("q", start_ms if start_ms is not None else ())
+        self.sync_type = SYNCED if start_ms is not None else UNSYNCED
+        self.digits = digits
+        if self.sync_type == SYNCED and len(self.start_ms) != len(self.texts):
+            raise ValueError(f"{len(self.start_ms)} start times for {len(self.texts)} lines")
+
+    @classmethod
+    def from_lrc(cls, lrc: str, source: str) -> "Lyrics":
+        """parse .lrc lines
+
+        a line with several timestamps ([00:12.00][01:30.00]chorus) becomes one
+        line per timestamp, in time order. lines without a timestamp are kept
+        UNTIMED after the line before them. timestamps are written back with
+        the precision of the first one.
+        """
+        start_ms = []
+        texts = []
+        digits = None
+        repeated = False
+        for line in lrc.splitlines():
+            match = LRC_TIMES_PATTERN.match(line)
+            if match is None:
+                start_ms.append(UNTIMED)
+                texts.append(line)
+                continue
+            text = line[match.end():]
+            times = LRC_TIME_PATTERN.findall(match.group())
+            repeated = repeated or len(times) > 1
+            for minutes, seconds, fraction in times:
+                if digits is None: digits = len(fraction)
+                start_ms.append(timestamp_to_ms(minutes, seconds, fraction))
+                texts.append(text)
+        if repeated:
+            # untimed lines sort along with the line before them
+            keys = []
+            for ms in start_ms: keys.append(ms if ms != UNTIMED else (keys[-1] if keys else 0))
+            order = sorted(range(len(texts)), key=keys.__getitem__)
+            start_ms, texts = [start_ms[i] for i in order], [texts[i] for i in order]
+        return cls(texts, source=source, start_ms=start_ms, digits=2 if digits is None else digits)
+
+    @classmethod
+    def from_text(cls, text: str, source: str) -> "Lyrics":
+        """plain text, one line per line"""
+        return cls(text.splitlines(), source=source)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Lyrics":
+        return cls(data["texts"], source=data["source"], start_ms=data["start_ms"] if data["sync_type"] == SYNCED else None, digits=data.get("digits", 2))
+
+    def to_dict(self) -> dict:
+        return {"source": self.source, "sync_type": self.sync_type, "start_ms": self.start_ms.tolist(), "texts": self.texts, "digits": self.digits}
+
+    @property
+    def synced(self) -> bool:
+        return self.sync_type == SYNCED
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[tuple]:
+        """(start_ms, text) per line, start_ms is None for unsynced lyrics and untimed lines"""
+        if self.synced: return ((ms if ms != UNTIMED else None, text) for ms, text in zip(self.start_ms, self.texts))
+        return ((None, text) for text in self.texts)
+
+    def __str__(self) -> str:
+        return self.serialize()
+
+    def __repr__(self) -> str:
+        return f"Lyrics({self.source!r}, {self.sync_type}, {len(self)} lines)"
+
+    def to_lrc(self) -> str:
+        lines = (f"[{ms_to_timestamp(ms, digits=self.digits)}]{text}" if ms != UNTIMED else text for ms, text in zip(self.start_ms, self.texts))
+        return "\n".join(lines) + f"\n\nSource: {self.source}"
+
+    def to_plain(self) -> str:
+        return "\n".join(self.texts) + f"\n\nSource: {self.source}"
+
+    def serialize(self) -> str:
+        """.lrc text for synced lyrics, plain text otherwise, with a source footer"""
+        return self.to_lrc() if self.synced else self.to_plain()
+
+    def as_unsynced(self) -> "Lyrics":
+        return Lyrics(self.texts, source=self.source)
+
+    def shifted(self, offset_ms: int) -> "Lyrics":
+        """copy with every start time moved by offset_ms, clamped at 0"""
+        if not self.synced: return self
+        return Lyrics(self.texts, source=self.source, start_ms=(max(0, ms + offset_ms) if ms != UNTIMED else UNTIMED for ms in self.start_ms), digits=self.digits)
+
+    def is_valid(self) -> bool:
+        """has text, and synced start times never go backwards"""
+        if not any(text.strip() for text in self.texts): return False
+        timed = [ms for ms in self.start_ms if ms != UNTIMED]
+        return all(a <= b for a, b in zip(timed, timed[1:]))
+
+
+if __name__ == "__main__":
+    # round trip of lrclib style .lrc: single timestamp lines come back byte for byte
+    LRCLIB_LRC = "[ar:Someone]\n[00:01.234] first\n[00:05.500] second\n\n[01:02.003] \n[01:10.990] last"
+    body = Lyrics.from_lrc(LRCLIB_LRC, source="Lrclib").to_lrc().rsplit("\n\nSource: ", 1)[0]
+    print(f"{'SUCCESS' if body == LRCLIB_LRC else 'FAILURE'} - single timestamp lines round trip")
+
+    # repeated lines are expanded into one line per timestamp, and stay that way
+    REPEATED_LRC = "[00:12.00][01:30.00]chorus\n[00:20.00]verse\n[01:40.00]outro"
+    lyrics = Lyrics.from_lrc(REPEATED_LRC, source="Lrclib")
+    again = Lyrics.from_lrc(lyrics.to_lrc(), source="Lrclib")
+    expanded = list(lyrics)[:4] == [(12000, "chorus"), (20000, "verse"), (90000, "chorus"), (100000, "outro")]
+    print(f"{'SUCCESS' if expanded and list(again)[:4] == list(lyrics)[:4] else 'FAILURE'} - repeated lines round trip")
@@ -0,0 +1,93 @@
+import sqlite3
+import time
+import logging
+from pathlib import Path
+from utils.helpers import read_song_metadata
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    tag_hash TEXT,
+    outcome TEXT NOT NULL,
+    provider TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL
+)
+"""
+
+# outcomes
+FOUND = "found"
+NOT_FOUND = "not_found"
+ERROR = "error"
+EXISTING = "existing"   # .lrc was already there before the manifest knew the song
+
+class LibraryManifest:
+    """per song record of the last run, used to skip songs that need no work
+
+    every record is committed right away, so an interrupted run resumes
+    where it stopped.
+    """
+    def __init__(self, db_path: str, retry_failed_after_s: float):
+        self.retry_failed_after_s = retry_failed_after_s
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def needs_processing(self, song_path: Path, lrc_path: Path) -> bool:
+        """check whether a song is new, changed or a failure due for retry
+
+        :param song_path: song path
+        :type song_path: Path
+        :param lrc_path: where lyrics of this song are saved
+        :type lrc_path: Path
+        :return: True if song should be fetched
+        :rtype: bool
+        """
+        stat = song_path.stat()
+        row = self._conn.execute(
+            "SELECT size, mtime, tag_hash, outcome, updated_at FROM songs WHERE path = ?",
+            (str(song_path),),
+        ).fetchone()
+
+        if row is None:
+            if lrc_path.exists():   # lyrics from an earlier run or another tool, keep them
+                self.record(song_path, outcome=EXISTING)
+                return False
+            return True
+
+        size, mtime, tag_hash, outcome, updated_at = row
+        if outcome == EXISTING: return False    # the user's own .lrc, never overwritten. its tags were never read, so no tag_hash to compare
+        if (size, mtime) != (stat.st_size, stat.st_mtime):
+            # file was touched, only refetch when the tags changed too
+            try: new_tag_hash = read_song_metadata(song_path).tag_hash
+            except Exception: return True
+            if new_tag_hash != tag_hash:
+                return True
+            self._conn.execute("UPDATE songs SET size = ?, mtime = ? WHERE path = ?", (stat.st_size, stat.st_mtime, str(song_path)))
+            self._conn.commit()
+
+        if outcome == FOUND:
+            return False
+        return time.time() - updated_at >= self.retry_failed_after_s
+
+    def record(self, song_path: Path, outcome: str, provider: str|None = None, tag_hash: str|None = None):
+        """record the outcome of a song and checkpoint it"""
+        stat = song_path.stat()
+        self._conn.execute(
+            """INSERT INTO songs (path, size, mtime, tag_hash, outcome, provider, attempts, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+               ON CONFLICT(path) DO UPDATE SET
+                   size = excluded.size, mtime = excluded.mtime, tag_hash = excluded.tag_hash,
+                   outcome = excluded.outcome, provider = excluded.provider,
+                   attempts = songs.attempts + 1, updated_at = excluded.updated_at""",
+            (str(song_path), stat.st_size, stat.st_mtime, tag_hash, outcome, provider, time.time()),
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
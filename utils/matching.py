@@ -0,0 +1,85 @@
+import numpy as np
+from rapidfuzz import fuzz, process
+from utils.helpers import clean_string, SongMetadata
+from utils.metrics import metrics
+from config import MATCH_DURATION_TOLERANCE_S
+
+
+def score_candidates(local_song: SongMetadata, received_song_infos: list[str]) -> np.ndarray:
+    """fuzzy score every candidate against the local title, artist and album in one batched call
+
+    :param local_song: local song metadata
+    :type local_song: SongMetadata
+    :param received_song_infos: candidate descriptions as strings, cleaned here
+    :type received_song_infos: list[str]
+    :return: 3 x len(received_song_infos) scores [0-100], rows are title, artist, album
+    :rtype: np.ndarray
+    """
+    choices = [clean_string(info) for info in received_song_infos]
+    queries = [local_song.title, local_song.artist, local_song.album]
+    return process.cdist(queries, choices, scorer=fuzz.partial_ratio, dtype=np.float32)
+
+def best_match(local_song: SongMetadata, received_song_infos: list[str], threshold: float, durations: list[float|None]|None = None, duration_tolerance_s: float|None = MATCH_DURATION_TOLERANCE_S) -> int|None:
+    """pick the best candidate of a provider search
+
+    a candidate passes like match_song_metadata does: title above threshold and
+    artist or album above threshold. of the passing ones the highest title +
+    max(artist, album) score wins, ties go to the provider's own order.
+    candidates whose duration is off by more than duration_tolerance_s are
+    dropped before scoring.
+
+    :param local_song: local song metadata
+    :type local_song: SongMetadata
+    :param received_song_infos: candidate descriptions as strings
+    :type received_song_infos: list[str]
+    :param threshold: [0-100]
+    :type threshold: float
+    :param durations: candidate durations in seconds, None where unknown
+    :type durations: list[float|None] | None
+    :param duration_tolerance_s: allowed duration difference, None = no duration filter
+    :type duration_tolerance_s: float | None
+    :return: index of the best candidate in received_song_infos, None if none passes
+    :rtype: int | None
+    """
+    with metrics.span("match"):
+        return _best_match(local_song, received_song_infos, threshold, durations, duration_tolerance_s)
+
+def _best_match(local_song: SongMetadata, received_song_infos: list[str], threshold: float, durations: list[float|None]|None, duration_tolerance_s: float|None) -> int|None:
+    indices = list(range(len(received_song_infos)))
+    if durations is not None and duration_tolerance_s is not None and local_song.duration > 0:
+        indices = [
+            i for i in indices
+            if not durations[i] or abs(durations[i] - local_song.duration) <= duration_tolerance_s
+        ]
+    if not indices: return None
+
+    scores = score_candidates(local_song, [received_song_infos[i] for i in indices])
+    title_scores = scores[0]
+    other_scores = np.maximum(scores[1], scores[2])     # artist or album
+    passed = (title_scores >= threshold) & (other_scores >= threshold)
+    if not passed.any(): return None
+    combined = np.where(passed, title_scores + other_scores, -1.0)
+    return indices[int(np.argmax(combined))]
+
+def best_album_match(local_song: SongMetadata, received_album_infos: list[str], threshold: float) -> int|None:
+    """pick the album of a song from an album search
+
+    album and album artist (or artist) must both score above threshold,
+    the highest sum wins.
+
+    :param local_song: local song metadata
+    :type local_song: SongMetadata
+    :param received_album_infos: candidate album descriptions (album name and artists) as strings
+    :type received_album_infos: list[str]
+    :param threshold: [0-100]
+    :type threshold: float
+    :return: index of the best album in received_album_infos, None if none passes
+    :rtype: int | None
+    """
+    if not received_album_infos: return None
+    choices = [clean_string(info) for info in received_album_infos]
+    queries = [local_song.album, local_song.albumartist or local_song.artist]
+    scores = process.cdist(queries, choices, scorer=fuzz.partial_ratio, dtype=np.float32)
+    passed = (scores[0] >= threshold) & (scores[1] >= threshold)
+    if not passed.any(): return None
+    return int(np.argmax(np.where(passed, scores[0] + scores[1], -1.0)))
@@ -0,0 +1,190 @@
+import json
+import math
+import time
+import threading
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+log = logging.getLogger(__name__)
+
+# song and provider a span belongs to, set by the caller around a lookup
+_song_ctx: ContextVar[str|None] = ContextVar("song", default=None)
+_provider_ctx: ContextVar[str|None] = ContextVar("provider", default=None)
+
+# lookup outcomes
+HIT = "hit"
+MISS = "miss"
+THROTTLED = "throttled"
+ERROR = "error"
+SKIPPED = "skipped"     # circuit breaker open
+
+QUANTILES = (0.5, 0.95, 0.99)
+PROM_PREFIX = "lyricsforge"
+
+
+def _quantile(sorted_values: list[float], q: float) -> float:
+    """nearest rank quantile of sorted values"""
+    if not sorted_values: return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+def _prom_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_prom_escape(value)}"' for key, value in labels.items() if value is not None) + "}"
+
+class Span:
+    """one timed stage, attributes can be set while it runs"""
+    __slots__ = ("song", "provider", "stage", "duration_s", "outcome", "status", "bytes")
+
+    def __init__(self, stage: str, provider: str|None, song: str|None):
+        self.stage = stage
+        self.provider = provider
+        self.song = song
+        self.duration_s = 0.0
+        self.outcome: str|None = None
+        self.status: int|None = None     # http status
+        self.bytes: int|None = None      # response size
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+class Metrics:
+    """per song, per provider, per stage timings of a run
+
+    spans are kept as they are for the json export, and summarized into
+    p50/p95/p99 latencies, lookup hit rates and http totals at the end.
+    """
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    @contextmanager
+    def context(self, song: str|None = None, provider: str|None = None) -> Iterator[None]:
+        """spans recorded inside belong to this song/provider"""
+        tokens = []
+        if song is not None: tokens.append((_song_ctx, _song_ctx.set(song)))
+        if provider is not None: tokens.append((_provider_ctx, _provider_ctx.set(provider)))
+        try: yield
+        finally:
+            for var, token in reversed(tokens): var.reset(token)
+
+    @contextmanager
+    def span(self, stage: str, provider: str|None = None) -> Iterator[Span]:
+        """time a stage, the span is recorded even if the stage raises
+
+        :param stage: stage name, eg. "search"
+        :type stage: str
+        :param provider: provider name, defaults to the one of the current context
+        :type provider: str | None
+        """
+        span = Span(stage, provider or _provider_ctx.get(), _song_ctx.get())
+        start = time.perf_counter()
+        try: yield span
+        except BaseException:
+            if span.outcome is None: span.outcome = ERROR
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - start
+            with self._lock: self.spans.append(span)
+
+    def _snapshot(self) -> list[Span]:
+        with self._lock: return list(self.spans)
+
+    def summary(self) -> dict:
+        """latency quantiles per provider and stage, lookup outcomes and http totals per provider"""
+        durations = defaultdict(list)
+        outcomes = defaultdict(lambda: defaultdict(int))
+        http = defaultdict(lambda: {"responses": defaultdict(int), "bytes": 0})
+        for span in self._snapshot():
+            provider = span.provider or "-"
+            durations[(provider, span.stage)].append(span.duration_s)
+            if span.stage == "lookup" and span.outcome is not None:
+                outcomes[provider][span.outcome] += 1
+            if span.status is not None:
+                http[provider]["responses"][str(span.status)] += 1
+                http[provider]["bytes"] += span.bytes or 0
+
+        latencies = {}
+        for (provider, stage), values in sorted(durations.items()):
+            values.sort()
+            latencies.setdefault(provider, {})[stage] = {
+                "count": len(values),
+                "sum_s": sum(values),
+                **{f"p{round(q * 100)}_s": _quantile(values, q) for q in QUANTILES},
+            }
+        lookups = {}
+        for provider, counts in outcomes.items():
+            total = sum(counts.values())
+            lookups[provider] = {**counts, "total": total, "hit_rate": counts.get(HIT, 0) / total if total else 0.0}
+        return {
+            "elapsed_s": time.time() - self.started_at,
+            "latencies": latencies,
+            "lookups": lookups,
+            "http": {provider: {"responses": dict(v["responses"]), "bytes": v["bytes"]} for provider, v in http.items()},
+        }
+
+    def report_lines(self) -> list[str]:
+        """human readable summary, one line per provider and stage"""
+        summary = self.summary()
+        lines = []
+        for provider, stages in summary["latencies"].items():
+            for stage, s in stages.items():
+                lines.append(f"{provider:<12} {stage:<14} n={s['count']:<6} p50={s['p50_s'] * 1000:8.1f}ms p95={s['p95_s'] * 1000:8.1f}ms p99={s['p99_s'] * 1000:8.1f}ms")
+        for provider, counts in summary["lookups"].items():
+            lines.append(f"{provider:<12} hit rate {counts['hit_rate'] * 100:0.1f}% ({counts.get(HIT, 0)}/{counts['total']})")
+        return lines
+
+    def to_json(self) -> str:
+        return json.dumps({"summary": self.summary(), "spans": [span.to_dict() for span in self._snapshot()]}, ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        """prometheus text exposition format"""
+        summary = self.summary()
+        lines = [
+            f"# HELP {PROM_PREFIX}_stage_duration_seconds duration of a pipeline stage",
+            f"# TYPE {PROM_PREFIX}_stage_duration_seconds summary",
+        ]
+        for provider, stages in summary["latencies"].items():
+            for stage, s in stages.items():
+                for q in QUANTILES:
+                    lines.append(f"{PROM_PREFIX}_stage_duration_seconds{_prom_labels(provider=provider, stage=stage, quantile=q)} {s[f'p{round(q * 100)}_s']:.6f}")
+                lines.append(f"{PROM_PREFIX}_stage_duration_seconds_sum{_prom_labels(provider=provider, stage=stage)} {s['sum_s']:.6f}")
+                lines.append(f"{PROM_PREFIX}_stage_duration_seconds_count{_prom_labels(provider=provider, stage=stage)} {s['count']}")
+        lines += [
+            f"# HELP {PROM_PREFIX}_lookups_total provider lookups by outcome",
+            f"# TYPE {PROM_PREFIX}_lookups_total counter",
+        ]
+        for provider, counts in summary["lookups"].items():
+            for outcome, count in counts.items():
+                if outcome in ("total", "hit_rate"): continue
+                lines.append(f"{PROM_PREFIX}_lookups_total{_prom_labels(provider=provider, outcome=outcome)} {count}")
+        lines += [
+            f"# HELP {PROM_PREFIX}_http_responses_total http responses by status",
+            f"# TYPE {PROM_PREFIX}_http_responses_total counter",
+        ]
+        for provider, v in summary["http"].items():
+            for status, count in v["responses"].items():
+                lines.append(f"{PROM_PREFIX}_http_responses_total{_prom_labels(provider=provider, status=status)} {count}")
+        lines += [
+            f"# HELP {PROM_PREFIX}_http_response_bytes_total http response body bytes",
+            f"# TYPE {PROM_PREFIX}_http_response_bytes_total counter",
+        ]
+        for provider, v in summary["http"].items():
+            lines.append(f"{PROM_PREFIX}_http_response_bytes_total{_prom_labels(provider=provider)} {v['bytes']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_file: str|None, prometheus_file: str|None):
+        """write the json and prometheus exports, None skips one"""
+        if json_file:
+            with open(json_file, "w", encoding="utf-8") as f: f.write(self.to_json())
+        if prometheus_file:
+            with open(prometheus_file, "w", encoding="utf-8") as f: f.write(self.to_prometheus())
+
+
+# shared by every module of a run
+metrics = Metrics()
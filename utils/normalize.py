@@ -0,0 +1,30 @@
+import re
+from functools import lru_cache
+from config import STOP_PHRASES, NORMALIZE_CACHE_SIZE
+
+# brackets with their content and the whitespace before them are dropped,
+# punctuation (keeping unicode letters and ÷ for other languages) and "_" become spaces
+_BRACKETS_OR_PUNCTUATION = re.compile(r"(\s*\([^)]*\))|[^\w\s÷]|_", flags=re.UNICODE)
+_STOP_PHRASES = [re.compile(r"\s*" + re.escape(phrase), flags=re.IGNORECASE) for phrase in STOP_PHRASES]
+
+def _replace(match: re.Match) -> str:
+    return "" if match.group(1) is not None else " "
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(raw_string: str) -> str:
+    """
+    clean a string for matching, memoized
+
+    same output as the step by step regex version: lowercase, drop (brackets),
+    punctuation to spaces, drop stop phrases, collapse whitespace.
+    stop phrases are matched after punctuation is removed.
+
+    :param raw_string: raw string
+    :type raw_string: str
+    :return: a clean string in lowercase
+    :rtype: str
+    """
+    clean_string = _BRACKETS_OR_PUNCTUATION.sub(_replace, raw_string.lower())
+    for pattern in _STOP_PHRASES:
+        clean_string = pattern.sub("", clean_string)
+    return " ".join(clean_string.split())
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Iterator, Any
+import heapq
+import itertools
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def run_concurrent(
+    items: Iterable,
+    worker: Callable[[Any], Any],
+    max_workers: int,
+    requeue: Callable[[Any, BaseException], float|None]|None = None,
+) -> Iterator[tuple]:
+    """run worker over items in a thread pool, keeping at most max_workers items in flight
+
+    items are pulled lazily, so a streaming source (eg. a generator) starts
+    feeding the workers before it is exhausted.
+
+    :param items: work items
+    :type items: Iterable
+    :param worker: callable run once per item
+    :type worker: Callable
+    :param max_workers: global cap of items in flight
+    :type max_workers: int
+    :param requeue: called with (item, exception) when a worker fails, returns a delay in
+        seconds to run the item again later, or None to give up and yield the failure
+    :type requeue: Callable | None
+    :return: (item, result, exception) tuples in completion order, exception is None on success
+    :rtype: Iterator[tuple]
+    """
+    max_workers = max(1, max_workers)
+    items = iter(items)
+    exhausted = False
+    pending = {}
+    deferred = []   # heap of (due, seq, item)
+    seq = itertools.count()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="song") as executor:
+        def fill():
+            nonlocal exhausted
+            while len(pending) < max_workers:
+                if deferred and deferred[0][0] <= time.monotonic():
+                    item = heapq.heappop(deferred)[2]
+                elif not exhausted:
+                    try: item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        continue
+                else: return
+                pending[executor.submit(worker, item)] = item
+
+        fill()
+        while pending or deferred:
+            if not pending:     # only requeued items left, wait for the next one
+                time.sleep(max(0.0, deferred[0][0] - time.monotonic()))
+                fill()
+                continue
+            timeout = max(0.0, deferred[0][0] - time.monotonic()) if deferred else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                exception = future.exception()
+                if exception is not None and requeue is not None:
+                    delay_s = requeue(item, exception)
+                    if delay_s is not None:
+                        heapq.heappush(deferred, (time.monotonic() + delay_s, next(seq), item))
+                        continue
+                result = None if exception else future.result()
+                yield item, result, exception
+            fill()
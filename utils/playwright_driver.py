@@ -1,4 +1,4 @@
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, Page, Route
 from pathlib import Path
 from typing import Optional, List
 import logging
@@ -7,12 +7,25 @@ import shutil
 log = logging.getLogger(__name__)
 
 class PlaywrightDriver:
+    """one warm chromium with a bounded pool of pages
+
+    every page shares the persistent context, so all of them see the logged
+    in profile. pages are checked out and returned, a page is recycled after
+    max_page_uses lookups or after an error. requests of the blocked resource
+    types (eg. images, fonts) are aborted for every page.
+
+    playwright's sync api is not thread safe, use a driver from the thread
+    that created it only.
+    """
     def __init__(
         self,
         user_data_dir: str = "playwright_profile",
         headless: bool = True,
         args: Optional[List[str]] = None,
         timeout_ms: int = 30_000,
+        pool_size: int = 1,
+        max_page_uses: int = 50,
+        blocked_resources: Optional[List[str]] = None,
     ):
         self._playwright = sync_playwright().start()
 
@@ -34,17 +47,88 @@ class PlaywrightDriver:
             args=chromium_args,
         )
 
-        self.page = self._context.pages[0]
-        self.page.set_default_timeout(timeout_ms)
-        self.page.set_default_navigation_timeout(timeout_ms)
+        self.blocked_resources = set(blocked_resources or [])
+        if self.blocked_resources:
+            self._context.route("**/*", self._route)
+
+        self.timeout_ms = timeout_ms
+        self.pool_size = max(1, pool_size)
+        self.max_page_uses = max_page_uses
+        self._idle: list[Page] = []
+        self._uses: dict[Page, int] = {}    # pages owned by the pool -> lookups done
+
+        page = self._context.pages[0]
+        self._setup_page(page)
+        self._idle.append(page)
         log.info("==== Playwright Driver was started ====")
 
-    def get(self, url: str):
-        self.page.goto(url)
+    def _route(self, route: Route):
+        """abort requests of the blocked resource types, let the rest through"""
+        if route.request.resource_type in self.blocked_resources: route.abort()
+        else: route.continue_()
+
+    def _setup_page(self, page: Page):
+        page.set_default_timeout(self.timeout_ms)
+        page.set_default_navigation_timeout(self.timeout_ms)
+        self._uses[page] = 0
+
+    def _is_healthy(self, page: Page) -> bool:
+        if page.is_closed(): return False
+        try: return page.evaluate("1") == 1
+        except Exception: return False
+
+    def _discard(self, page: Page):
+        self._uses.pop(page, None)
+        if len(self._context.pages) <= 1:  # keep a window open, so the persistent browser stays up
+            replacement = self._context.new_page()
+            self._setup_page(replacement)
+            self._idle.append(replacement)
+        try: page.close()
+        except Exception: pass
+
+    def checkout(self) -> Page:
+        """take a healthy page from the pool, opening a new one if there is room
+
+        :return: page reserved for the caller until checkin()
+        :rtype: Page
+        :raises RuntimeError: if every page of the pool is checked out
+        """
+        while self._idle:
+            page = self._idle.pop()
+            if self._is_healthy(page): return page
+            log.info("RECYCLE - unhealthy playwright page")
+            self._discard(page)
+
+        if len(self._uses) >= self.pool_size:
+            raise RuntimeError(f"all {self.pool_size} playwright pages are checked out")
+        page = self._context.new_page()
+        self._setup_page(page)
+        return page
+
+    def checkin(self, page: Page, failed: bool = False):
+        """return a page to the pool, recycling it after an error or max_page_uses lookups"""
+        if page not in self._uses: return
+        self._uses[page] += 1
+        if failed or self._uses[page] >= self.max_page_uses or page.is_closed():
+            self._discard(page)
+            return
+        self._idle.append(page)
+
+    def get(self, url: str) -> Page:
+        """open url on a pooled page, the page stays open in the pool
+
+        :return: the page url was opened on
+        :rtype: Page
+        """
+        page = self.checkout()
+        try: page.goto(url)
+        except Exception:
+            self.checkin(page, failed=True)
+            raise
+        self.checkin(page)
+        return page
 
     def close(self):
         self._context.close()
         self._playwright.stop()
         log.info("==== Playwright Driver was closed ====")
-
-
@@ -0,0 +1,172 @@
+import sqlite3
+import threading
+import unicodedata
+import logging
+from collections import Counter
+from utils.helpers import SongMetadata
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS provider_stats (
+    bucket TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    lookups INTEGER NOT NULL,
+    synced_hits INTEGER NOT NULL,
+    unsynced_hits INTEGER NOT NULL,
+    total_s REAL NOT NULL,
+    PRIMARY KEY (bucket, provider)
+)
+"""
+
+# priors of a provider without enough lookups in any bucket
+PRIOR_HIT_RATE = 0.5
+PRIOR_LATENCY_S = 1.0
+
+
+def title_script(title: str) -> str:
+    """main script of a title, eg. "latin", "devanagari", "unknown" without letters"""
+    scripts = Counter()
+    for char in title:
+        if char.isalpha():
+            try: scripts[unicodedata.name(char).split(" ", 1)[0].lower()] += 1
+            except ValueError: continue     # unnamed character
+    return scripts.most_common(1)[0][0] if scripts else "unknown"
+
+def song_buckets(song: SongMetadata) -> list[str]:
+    """feature buckets of a song, most specific first"""
+    title = song.raw_tags[0]
+    return [
+        f"dir:{song.path.parent.as_posix()}",
+        f"albumartist:{song.albumartist or song.artist}",
+        f"script:{title_script(title or song.title)}",
+        "all",
+    ]
+
+class ProviderStats:
+    """per provider hit rate and latency of lookups, bucketed by song features
+
+    buckets are the song's directory, its album artist, the script of its
+    title and "all". a provider is judged by the most specific bucket with
+    at least min_lookups of its lookups, the priors stand in until then.
+    synced and unsynced hits are counted apart, a provider that only has
+    unsynced lyrics isn't a hit for a run that wants synced ones.
+    stats are kept in memory during a run and added to db_path on flush.
+    """
+    def __init__(self, db_path: str|None, min_lookups: int):
+        """
+        :param db_path: sqlite file the stats persist in, None = this run only
+        :type db_path: str | None
+        :param min_lookups: lookups of a provider a bucket needs before it is trusted
+        :type min_lookups: int
+        """
+        self.db_path = db_path
+        self.min_lookups = min_lookups
+        self._lock = threading.Lock()
+        self._stats: dict[tuple[str, str], list] = {}     # (bucket, provider) -> [lookups, synced_hits, unsynced_hits, total_s]
+        self._unsaved: dict[tuple[str, str], list] = {}   # added since the last flush
+        if db_path:
+            with sqlite3.connect(db_path) as conn:
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(provider_stats)")]
+                if "hits" in columns:   # stats of any hit, they can't be split into synced and unsynced
+                    log.warning("==== Provider stats without synced hits were discarded ====")
+                    conn.execute("DROP TABLE provider_stats")
+                conn.execute(SCHEMA)
+                for bucket, provider, *entry in conn.execute("SELECT * FROM provider_stats"):
+                    self._stats[(bucket, provider)] = entry
+            conn.close()
+
+    def record(self, song: SongMetadata, provider: str, synced: bool, unsynced: bool, duration_s: float):
+        """add the outcome of a lookup to every bucket of the song
+
+        :param synced: the provider had synced lyrics
+        :type synced: bool
+        :param unsynced: the provider had unsynced lyrics
+        :type unsynced: bool
+        """
+        with self._lock:
+            for bucket in song_buckets(song):
+                for table in (self._stats, self._unsaved):
+                    entry = table.setdefault((bucket, provider), [0, 0, 0, 0.0])
+                    entry[0] += 1
+                    entry[1] += int(synced)
+                    entry[2] += int(unsynced)
+                    entry[3] += duration_s
+
+    def estimate(self, song: SongMetadata, provider: str, kind: str = "synced") -> tuple[float, float, str|None]:
+        """(hit rate, mean latency in seconds, bucket) of a provider for a song, bucket is None for the priors
+
+        :param kind: "synced" or "unsynced" hits
+        :type kind: str
+        """
+        return self._estimate(song_buckets(song), provider, kind)
+
+    def _trusted(self, buckets: list[str], provider: str) -> tuple[str|None, tuple]:
+        """most specific bucket with min_lookups of the provider and its entry, (None, empty entry) if none"""
+        with self._lock:
+            for bucket in buckets:
+                entry = tuple(self._stats.get((bucket, provider), (0, 0, 0, 0.0)))
+                if entry[0] >= self.min_lookups: return (bucket, entry)
+        return (None, (0, 0, 0, 0.0))
+
+    def _estimate(self, buckets: list[str], provider: str, kind: str) -> tuple[float, float, str|None]:
+        bucket, (lookups, synced_hits, unsynced_hits, total_s) = self._trusted(buckets, provider)
+        if bucket is None: return (PRIOR_HIT_RATE, PRIOR_LATENCY_S, None)
+        hits = synced_hits if kind == "synced" else unsynced_hits
+        # smoothed towards the priors, so a few lucky lookups don't decide
+        return ((hits + PRIOR_HIT_RATE) / (lookups + 1), (total_s + PRIOR_LATENCY_S) / (lookups + 1), bucket)
+
+    def order(self, song: SongMetadata, providers: list[str], fetch_mode: int) -> list[str]:
+        """providers by expected time to an acceptable hit, fastest first
+
+        asking providers in order of hit rate / latency, highest first,
+        minimizes the expected time until one of them has the song. synced
+        and synced with fallback rank by synced hits, unsynced by unsynced
+        hits. with fallback, an unsynced hit ends the lookup, so providers
+        that never had synced lyrics for these songs go after the others,
+        ranked by their unsynced hits. providers with equal scores keep
+        their given (priority) order.
+
+        :param song: song metadata
+        :type song: SongMetadata
+        :param providers: provider names in priority order
+        :type providers: list[str]
+        :param fetch_mode: synced[0], unsynced[1], synced_with_fallback[2]
+        :type fetch_mode: int
+        :return: provider names in lookup order
+        :rtype: list[str]
+        """
+        buckets = song_buckets(song)
+        def score(provider: str) -> tuple[bool, float]:
+            kind = "unsynced" if fetch_mode == 1 else "synced"
+            if fetch_mode not in (0, 1):
+                bucket, entry = self._trusted(buckets, provider)
+                if bucket is not None and entry[1] == 0: kind = "unsynced"  # no synced lyrics so far
+            hit_rate, latency_s, _ = self._estimate(buckets, provider, kind)
+            return (kind == "synced" or fetch_mode == 1, hit_rate / max(latency_s, 1e-3))
+        return sorted(providers, key=score, reverse=True)
+
+    def rows(self, bucket_prefix: str = "") -> list[tuple]:
+        """(bucket, provider, lookups, synced_hits, unsynced_hits, total_s) rows, for inspection"""
+        with self._lock:
+            return sorted(
+                (bucket, provider, *entry)
+                for (bucket, provider), entry in self._stats.items() if bucket.startswith(bucket_prefix)
+            )
+
+    def flush(self):
+        """add the lookups of this run to the database"""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+        if not self.db_path or not unsaved: return
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany("""
+                INSERT INTO provider_stats VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (bucket, provider) DO UPDATE SET
+                    lookups = lookups + excluded.lookups,
+                    synced_hits = synced_hits + excluded.synced_hits,
+                    unsynced_hits = unsynced_hits + excluded.unsynced_hits,
+                    total_s = total_s + excluded.total_s
+            """, [(bucket, provider, *entry) for (bucket, provider), entry in unsaved.items()])
+        conn.close()
+        log.info(f"==== Provider stats were saved ({len(unsaved)} buckets updated) ====")
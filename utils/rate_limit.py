@@ -0,0 +1,117 @@
+import threading
+import time
+import logging
+from email.utils import parsedate_to_datetime
+from config import RATE_LIMITS, RATE_LIMIT_MAX_WAIT_S
+
+log = logging.getLogger(__name__)
+
+_waits = threading.local()  # time each thread spent waiting for tokens
+
+def waited_s() -> float:
+    """seconds the calling thread has waited in any limiter so far"""
+    return getattr(_waits, "total_s", 0.0)
+
+class RateLimited(Exception):
+    """a provider throttled a request, retry the song after retry_after_s"""
+    def __init__(self, provider: str, retry_after_s: float|None = None):
+        self.provider = provider
+        self.retry_after_s = retry_after_s
+        super().__init__(f"{provider} rate limited" + (f", retry after {retry_after_s:0.1f}s" if retry_after_s else ""))
+
+def parse_retry_after(value: str|None) -> float|None:
+    """parse a Retry-After header (seconds or http date) into seconds from now"""
+    if not value: return None
+    try: return max(0.0, float(value))
+    except ValueError: pass
+    try: return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError): return None
+
+class AdaptiveRateLimiter:
+    """token bucket per provider, its rate adapts with AIMD
+
+    every success raises the rate by a small step, a 429 halves it and
+    pauses the bucket for Retry-After, a 5xx lowers it a little.
+    """
+    INCREASE_STEP = 0.05     # requests/s added per success
+    THROTTLE_FACTOR = 0.5    # rate multiplier on 429
+    SERVER_ERROR_FACTOR = 0.8    # rate multiplier on 5xx
+
+    def __init__(self, name: str, rate: float, min_rate: float, max_rate: float, max_wait_s: float = RATE_LIMIT_MAX_WAIT_S):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_wait_s = max_wait_s
+        self.burst = max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """wait for a token
+
+        :raises RateLimited: if the wait would be longer than max_wait_s, so the
+            caller can move on to other providers instead of stalling
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._paused_until:
+                    wait_s = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait_s = (1 - self._tokens) / self.rate
+            if wait_s > self.max_wait_s:
+                raise RateLimited(self.name, retry_after_s=wait_s)
+            time.sleep(wait_s)
+            _waits.total_s = waited_s() + wait_s
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.INCREASE_STEP)
+
+    def on_throttle(self, retry_after_s: float|None = None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.THROTTLE_FACTOR)
+            pause_s = retry_after_s if retry_after_s is not None else 1 / self.rate
+            self._paused_until = max(self._paused_until, time.monotonic() + pause_s)
+            self._tokens = 0.0
+        log.warning(f"THROTTLED - {self.name}: rate lowered to {self.rate:0.2f}/s, paused {pause_s:0.1f}s")
+
+    def on_server_error(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.SERVER_ERROR_FACTOR)
+
+    def observe(self, response):
+        """adjust the rate from a provider response
+
+        :param response: http response of a request made after acquire()
+        :type response: requests.Response
+        :raises RateLimited: on http 429
+        """
+        if response.status_code == 429:
+            retry_after_s = parse_retry_after(response.headers.get("Retry-After"))
+            self.on_throttle(retry_after_s)
+            raise RateLimited(self.name, retry_after_s=retry_after_s)
+        if response.status_code >= 500:
+            self.on_server_error()
+        else:
+            self.on_success()
+
+
+_limiters: dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str) -> AdaptiveRateLimiter:
+    """shared limiter of a provider, configured from RATE_LIMITS"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            rate, min_rate, max_rate = RATE_LIMITS.get(provider, (5.0, 0.5, 20.0))
+            _limiters[provider] = AdaptiveRateLimiter(provider, rate=rate, min_rate=min_rate, max_rate=max_rate)
+        return _limiters[provider]
@@ -0,0 +1,77 @@
+import os
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+import logging
+from utils.helpers import read_song_metadata
+from utils.pipeline import run_concurrent
+
+log = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {".mp3", ".flac", ".wav", ".aac", ".m4a",".ogg", ".opus", ".alac", ".aiff"}
+
+def _matches(rel_path: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatch(rel_path, pattern) for pattern in patterns)
+
+def walk_audio_files(roots: Iterable[str], include: Iterable[str] = (), exclude: Iterable[str] = ()) -> Iterator[Path]:
+    """recursively walk roots with os.scandir, streaming audio files as they are found
+
+    globs are matched against the path relative to its root (with "/" separators),
+    an excluded directory is not descended into.
+
+    :param roots: music directories
+    :type roots: Iterable[str]
+    :param include: only yield files matching one of these globs, empty = everything
+    :type include: Iterable[str]
+    :param exclude: skip files and directories matching one of these globs
+    :type exclude: Iterable[str]
+    :return: audio file paths
+    :rtype: Iterator[Path]
+    """
+    include, exclude = tuple(include), tuple(exclude)
+    for root in roots:
+        root = os.path.abspath(root)
+        if not os.path.isdir(root):
+            log.warning(f"SKIPPED - music directory does not exist: {root}")
+            continue
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = sorted(entries, key=lambda entry: entry.name)
+            except OSError as e:
+                log.warning(f"SKIPPED - can not read directory {directory}: {e}")
+                continue
+            subdirs = []
+            for entry in entries:
+                rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                if exclude and _matches(rel_path, exclude): continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                    if include and not _matches(rel_path, include): continue
+                    yield Path(entry.path)
+            stack.extend(reversed(subdirs))    # depth first, in name order
+
+def scan_library(
+    roots: Iterable[str],
+    include: Iterable[str] = (),
+    exclude: Iterable[str] = (),
+    workers: int = 8,
+    path_filter: Callable[[Path], bool]|None = None,
+) -> Iterator[tuple]:
+    """stream songs of a library with their tags, read in a worker pool
+
+    results are yielded while the walk is still running, so the fetch
+    pipeline can start right away.
+
+    :param path_filter: called with each path before its tags are read, False skips it
+    :type path_filter: Callable | None
+    :return: (song_path, SongMetadata, None) or (song_path, None, exception) if tags can not be read
+    :rtype: Iterator[tuple]
+    """
+    paths = walk_audio_files(roots=roots, include=include, exclude=exclude)
+    if path_filter is not None:
+        paths = (song_path for song_path in paths if path_filter(song_path))
+    yield from run_concurrent(paths, worker=read_song_metadata, max_workers=workers)
@@ -2,8 +2,12 @@ import requests
 import json
 import os
 import time
+import hashlib
+import threading
 from dotenv import load_dotenv
 from utils.totp import TOTP
+from utils.credential_cache import CredentialCache
+from config import CREDENTIAL_CACHE_FILE, TOTP_SECRET_TTL_HOURS
 
 # ------------------------------------------
 TOKEN_URL = "https://open.spotify.com/api/token"
@@ -31,25 +35,44 @@ REFRESH_MARGIN_MS = 5 * 60 * 1000  # 5 minutes
 
 load_dotenv()
 SP_DC = os.getenv("SP_DC_TOKEN")
-if not SP_DC:
-    raise RuntimeError("SP_DC_TOKEN missing")
 
 # ------------------------------------------
 
 class SpotifyAuthManager:
-    def __init__(self, sp_dc: str = SP_DC):
+    def __init__(self, sp_dc: str|None = SP_DC, cache_file: str|None = CREDENTIAL_CACHE_FILE):
+        if not sp_dc:
+            raise RuntimeError("SP_DC_TOKEN missing")
         self.session = requests.Session()
         self.session.cookies.set("sp_dc", sp_dc)
         self.session.headers.update(HEADERS)
 
-        self.totp = TOTP()
+        # tokens are cached per account, never reuse a token of another sp_dc
+        self._account = hashlib.sha1(sp_dc.encode("utf-8")).hexdigest()[:12]
+        self.cache = CredentialCache(cache_file) if cache_file else None
+        self._totp = None   # only needed to mint, created on first mint
+        self._server_offset_ms = None   # server time - local time
+        self._lock = threading.Lock()
+
         self.access_token = None
         self.expires_at_ms = 0
+        cached = self.cache.get("spotify_token") if self.cache else None
+        if cached and cached.get("account") == self._account:
+            self.access_token = cached["access_token"]
+            self.expires_at_ms = cached["expires_at_ms"]
+
+    @property
+    def totp(self) -> TOTP:
+        if self._totp is None:
+            self._totp = TOTP(cache=self.cache, secret_ttl_s=TOTP_SECRET_TTL_HOURS * 3600)
+        return self._totp
 
     def _get_server_time_ms(self) -> int:
-        r = self.session.get(SERVER_TIME_URL, timeout=10)
-        r.raise_for_status()
-        return r.json()["serverTime"] * 1000
+        # the offset is fetched once and reused by later mints
+        if self._server_offset_ms is None:
+            r = self.session.get(SERVER_TIME_URL, timeout=10)
+            r.raise_for_status()
+            self._server_offset_ms = r.json()["serverTime"] * 1000 - int(time.time() * 1000)
+        return int(time.time() * 1000) + self._server_offset_ms
 
     def _mint_token(self):
         server_time_ms = self._get_server_time_ms()
@@ -70,21 +93,28 @@ class SpotifyAuthManager:
 
         self.access_token = data["accessToken"]
         self.expires_at_ms = data["accessTokenExpirationTimestampMs"]
+        if self.cache:
+            self.cache.set("spotify_token", {
+                "account": self._account,
+                "access_token": self.access_token,
+                "expires_at_ms": self.expires_at_ms,
+            })
 
         # Optional debug dump
         # with open("sp_token_data.json", "w", encoding="utf-8") as f:
         #     json.dump(data, f, indent=2)
 
     def get_token(self) -> str:
-        now_ms = int(time.time() * 1000)
+        with self._lock:    # shared by song workers, mint once
+            now_ms = int(time.time() * 1000)
 
-        if (
-            not self.access_token
-            or now_ms >= self.expires_at_ms - REFRESH_MARGIN_MS
-        ):
-            self._mint_token()
+            if (
+                not self.access_token
+                or now_ms >= self.expires_at_ms - REFRESH_MARGIN_MS
+            ):
+                self._mint_token()
 
-        return self.access_token
+            return self.access_token
 
 # ------------------------------------------
 # Usage
@@ -1,13 +1,17 @@
 import hashlib
 import hmac
 import math
+import time
 import requests
+from utils.credential_cache import CredentialCache
 
 
 # thanks to https://github.com/xyloflake/spot-secrets-go/
 SECRET_CIPHER_DICT_URL = "https://github.com/xyloflake/spot-secrets-go/blob/main/secrets/secretDict.json?raw=true"
 class TOTP:
-    def __init__(self) -> None:
+    def __init__(self, cache: CredentialCache|None = None, secret_ttl_s: float = 24 * 3600) -> None:
+        self.cache = cache
+        self.secret_ttl_s = secret_ttl_s
         self.secret, self.version = self.get_secret_version()
         self.period = 30
         self.digits = 6
@@ -30,12 +34,23 @@ class TOTP:
         return str(binary % (10**self.digits)).zfill(self.digits)
     
     def get_secret_version(self) -> tuple[str, int]:
-        req = requests.get(SECRET_CIPHER_DICT_URL)
-        if req.status_code != 200:
-            print("Failed to fetch TOTP secret and version.")
-        data = req.json()
+        cached = self.cache.get("totp") if self.cache else None
+        if cached and time.time() - cached["fetched_at"] < self.secret_ttl_s:
+            return bytes(cached["secret"], 'utf-8'), cached["version"]
+
+        try:
+            req = requests.get(SECRET_CIPHER_DICT_URL, timeout=10)
+            if req.status_code != 200:
+                print("Failed to fetch TOTP secret and version.")
+            data = req.json()
+        except (requests.RequestException, ValueError):
+            if cached:  # stale secret beats no secret
+                return bytes(cached["secret"], 'utf-8'), cached["version"]
+            raise
         secret_version = list(data.keys())[-1]
         ascii_codes = data[secret_version]
         transformed = [val ^ ((i % 33) + 9) for i, val in enumerate(ascii_codes)]
         secret_key = "".join(str(num) for num in transformed)
+        if self.cache:
+            self.cache.set("totp", {"secret": secret_key, "version": secret_version, "fetched_at": time.time()})
         return bytes(secret_key, 'utf-8'), secret_version
\ No newline at end of file
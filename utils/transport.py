@@ -0,0 +1,144 @@
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from utils.rate_limit import get_limiter
+from utils.metrics import metrics
+from utils.cassette import CassetteRecorder, cassette_key, CASSETTE_URL_HEADER
+from config import HTTP_POOL_MAXSIZE, HTTP_CONNECT_TIMEOUT_S, HTTP_READ_TIMEOUT_S, HTTP_RETRIES, HTTP_BACKOFF_FACTOR
+from config import HTTP_CASSETTE_MODE, HTTP_CASSETTE_FILE, HTTP_REPLAY_URL
+
+log = logging.getLogger(__name__)
+
+class _Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.value += 1
+
+_handshakes = _Counter()   # connects made by every pool, new connections and reconnects of dropped ones
+_wire_requests = _Counter()    # requests sent by every pool, urllib3's retries included
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _handshakes.increment()
+        super().connect()
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _handshakes.increment()
+        super().connect()
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+    def _make_request(self, *args, **kwargs):
+        _wire_requests.increment()
+        return super()._make_request(*args, **kwargs)
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+    def _make_request(self, *args, **kwargs):
+        _wire_requests.increment()
+        return super()._make_request(*args, **kwargs)
+
+class _PooledAdapter(HTTPAdapter):
+    """keep-alive adapter with one connection pool per host, counting connects and requests"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+class HttpTransport:
+    """one keep-alive http session shared by every fetcher
+
+    connections are pooled per host and reused. idempotent GETs are retried
+    with backoff on connection errors and 5xx, by urllib3 only. a connection
+    that breaks is dropped from its pool by urllib3 and the retry opens a
+    fresh one, instead of throwing the whole session away. requests made for
+    a provider go through its rate limiter.
+
+    responses can be recorded to a cassette, or replayed from a local replay
+    server (utils/cassette.py) instead of the real providers.
+    """
+    def __init__(self, pool_maxsize: int, connect_timeout_s: float, read_timeout_s: float, retries: int, backoff_factor: float,
+                 recorder: CassetteRecorder|None = None, replay_url: str|None = None):
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.recorder = recorder        # record responses of real requests
+        self.replay_url = replay_url    # send every request to this replay server instead
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=["GET", "HEAD"],
+            raise_on_status=False,
+        )
+        self._adapter = _PooledAdapter(pool_connections=32, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def get(self, url: str, provider: str|None = None, stage: str = "http", **kwargs) -> requests.Response:
+        """GET through the shared pool
+
+        :param url: request url
+        :type url: str
+        :param provider: provider name whose rate limiter the request goes through
+        :type provider: str | None
+        :param stage: pipeline stage the request is timed as, eg. "search"
+        :type stage: str
+        :return: response
+        :rtype: requests.Response
+        :raises RateLimited: if the provider throttles the request
+        :raises requests.RequestException: on connection errors, or a 5xx that is left after the retries
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        key = cassette_key(url, kwargs.get("params")) if self.recorder or self.replay_url else None
+        if self.replay_url:
+            kwargs.pop("params", None)
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), CASSETTE_URL_HEADER: key}
+            url = self.replay_url
+        limiter = get_limiter(provider) if provider else None
+        if limiter: limiter.acquire()
+        with metrics.span(stage, provider=provider) as span:
+            response = self.session.get(url, **kwargs)
+            span.status = response.status_code
+            span.bytes = len(response.content)
+        if self.recorder: self.recorder.record(key, response)
+        if limiter: limiter.observe(response)
+        if response.status_code >= 500:     # the provider is down, not a "not found"
+            raise requests.HTTPError(f"{response.status_code} Server Error for url: {response.url}", response=response)
+        return response
+
+    def stats(self) -> dict:
+        """requests sent (retries included), connects made and requests that went over an open connection"""
+        requests_made = _wire_requests.value
+        handshakes = _handshakes.value
+        return {
+            "requests": requests_made,
+            "handshakes": handshakes,
+            "reused": max(0, requests_made - handshakes),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+transport = HttpTransport(
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    connect_timeout_s=HTTP_CONNECT_TIMEOUT_S,
+    read_timeout_s=HTTP_READ_TIMEOUT_S,
+    retries=HTTP_RETRIES,
+    backoff_factor=HTTP_BACKOFF_FACTOR,
+    recorder=CassetteRecorder(HTTP_CASSETTE_FILE) if HTTP_CASSETTE_MODE == 1 else None,
+    replay_url=HTTP_REPLAY_URL if HTTP_CASSETTE_MODE == 2 else None,
+)